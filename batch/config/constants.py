@@ -10,6 +10,13 @@ DURATION_15M = '15m'
 DURATION_30M = '30m'
 DURATION_1H = '1h'
 DURATIONS_ALL = [DURATION_1M, DURATION_5M, DURATION_15M, DURATION_30M, DURATION_1H]
+DURATION_SECONDS = {
+    DURATION_1M: 60,
+    DURATION_5M: 60 * 5,
+    DURATION_15M: 60 * 15,
+    DURATION_30M: 60 * 30,
+    DURATION_1H: 60 * 60,
+}
 
 TRADER = 'SYSTEM'
 DIFF_JST_FROM_UTC = 9
@@ -1,49 +1,321 @@
-from datetime import datetime, timedelta
+import argparse
 import logging
+import os
+import subprocess
 import sys
-from threading import Thread
+import time
 
 from config import settings, constants
-from models.candle import create_candle_with_duration
-from models.dfcandle import DataFrameCandle
-from models.events import SignalEvents, SignalEvent
-from services.gmo_api import PublicWebSocketApi
-from services.gmo_api import Ticker
-from services.trade import AiTrade
+from utils.logs import setup_logging
 
 
 log_format = '%(asctime)s %(name)-2s %(levelname)s：%(message)s'
-logging.basicConfig(
-    level=logging.INFO, filename=settings.log_path, format=log_format)
+setup_logging(filename=settings.log_path, level=logging.INFO, fmt=log_format)
 
 
-if __name__ == '__main__':
+def start_metrics_server():
+    port = getattr(settings, 'metrics_port', None)
+    if port:
+        from utils.prometheus import start_http_server
+        start_http_server(port)
+
+
+def install_profiler():
+    from utils.profiling import PROFILER
+    PROFILER.output_dir = getattr(settings, 'profile_dir', PROFILER.output_dir)
+    PROFILER.window = getattr(settings, 'profile_window', PROFILER.window)
+    PROFILER.install_signal_handler()
+
+
+def install_memory_monitor():
+    from utils.memory import MEMORY
+    MEMORY.output_dir = getattr(settings, 'profile_dir', MEMORY.output_dir)
+    MEMORY.install_signal_handler()
+    MEMORY.start(getattr(settings, 'memory_sample_interval', 60 * 60))
+    if getattr(settings, 'memory_trace', False):
+        MEMORY.start_tracing()
+
+
+def start_retention():
+    interval = getattr(settings, 'retention_interval', None)
+    if interval:
+        from models.retention import RetentionManager
+        RetentionManager().start(interval)
+
+
+def trade(args):
+    from threading import Thread
+    from services.trade import AiTrade
+    if args.dry_run:
+        return
+
+    start_metrics_server()
+    install_profiler()
+    install_memory_monitor()
+    start_retention()
+
+    ai_trade = AiTrade()
+    thread = Thread(target=ai_trade.trade_start)
+    thread.start()
+    thread.join()
+
+
+def paper(args):
+    from threading import Thread
+    from services.multi import MultiStrategyTrade
+    if args.dry_run:
+        return
+
+    start_metrics_server()
+    install_profiler()
+    install_memory_monitor()
+
+    multi_trade = MultiStrategyTrade()
+    thread = Thread(target=multi_trade.trade_start)
+    thread.start()
+    thread.join()
+
+
+def cluster(args):
+    from services.topology import Supervisor
+    if args.dry_run:
+        return
+
+    start_metrics_server()
+    Supervisor().run()
+
+
+def backtest(args):
+    from models.ai import AI
+    if args.dry_run:
+        return
+
+    ai = AI(
+        symbol=settings.symbol,
+        use_percent=settings.use_percent,
+        duration=args.duration,
+        past_period=args.past_period,
+        stop_limit_percent=settings.stop_limit_percent,
+        back_test=True)
+    ai.trade()
+    print(f'signals: {len(ai.signal_events.signals)} profit: {ai.signal_events.profit}')
+
+
+def optimize(args):
+    from models.dfcandle import DataFrameCandle
+    from models.params import OptimizedParams
+    from models.params import sweep_settings
+    if args.dry_run:
+        return
+
+    df = DataFrameCandle(settings.symbol, args.duration)
+    df.set_all_candles(args.past_period)
+    if not df.candles:
+        print('no candles')
+        return
+    params = df.optimize_params(stop_limit_percent=settings.stop_limit_percent)
+    if params is None:
+        print('no profitable params')
+        return
+    OptimizedParams.store(settings.symbol, args.duration, args.past_period,
+                          df.candles[0].time, df.candles[-1].time, params,
+                          sweep_settings(settings.stop_limit_percent, settings.num_ranking))
+    print(params.__dict__)
+
+
+def sweep(args):
+    from services.sweep import DurationSweep
+    if args.dry_run:
+        return
+
+    report = DurationSweep(durations=args.durations, past_periods=args.past_periods,
+                           metric=args.metric, workers=args.workers).run(serial=args.compare_serial)
+    for r in report['ranking']:
+        print(f'{r["duration"]:>4} past_period={r["past_period"]} {args.metric}={r["value"]:.4f} '
+              f'seconds={r["seconds"]:.2f}')
+    print(f'jobs={report["jobs"]} workers={report["workers"]} parallel={report["parallel_seconds"]:.2f}s', end='')
+    if 'speedup' in report:
+        print(f' serial={report["serial_seconds"]:.2f}s speedup={report["speedup"]:.2f}x', end='')
+    print()
+    if report['best'] is not None:
+        print(f'best: duration={report["best"]["duration"]} past_period={report["best"]["past_period"]}')
+
+
+def import_candles(args):
+    from services.backfill import Backfill
+    if args.dry_run:
+        return
+
+    report = Backfill(durations=args.durations).warm_start(args.periods)
+    print(report)
+
+
+def rebuild(args):
+    from models.rollup import rebuild_candles
+    if args.dry_run:
+        return
+
+    for duration in args.durations:
+        count = rebuild_candles(settings.symbol, duration)
+        print(f'{duration}: {count} candles')
+
+
+def retention(args):
+    from models.retention import RetentionManager
+    if args.dry_run:
+        return
+
+    print(RetentionManager().run_once())
 
-    args = '0' if len(sys.argv) == 1 else sys.argv[1]
-
-    # production
-    if args == '0':
-        ai_trade = AiTrade()
-        thread = Thread(target=ai_trade.trade_start)
-        thread.start()
-        thread.join()
-
-    # Sample
-    if args == '1':
-        # from models.ai import AI
-        # ai = AI(
-        #     symbol=settings.symbol,
-        #     use_percent=settings.use_percent,
-        #     duration=settings.trade_duration,
-        #     past_period=settings.past_period,
-        #     stop_limit_percent=settings.stop_limit_percent,
-        #     back_test=False,
-        # )
-        # ai.start_trade -= timedelta(days=10)
-        #
-        # df = DataFrameCandle()
-        # df.set_all_candles(limit=1000)
-        # candle = df.candles[-1]
-        # ai.sell(candle)
-        print('### test ###')
-    
\ No newline at end of file
+
+def partition(args):
+    from models.candle import factory_candle_class
+    from models.retention import convert_to_partitioned
+    if args.dry_run:
+        return
+
+    for duration in args.durations:
+        cls = factory_candle_class(settings.symbol, duration)
+        print(f'{cls.__tablename__}: {convert_to_partitioned(cls)}')
+
+
+def init_db(args):
+    from models.base import init_db as create_tables
+    if args.dry_run:
+        return
+
+    create_tables()
+
+
+def bench_startup(args):
+    for command in args.commands or list(COMMANDS):
+        start = time.monotonic()
+        subprocess.run([sys.executable, os.path.abspath(__file__), command, '--dry-run'], check=True)
+        print(f'{command}: {time.monotonic() - start:.3f}s')
+
+
+def bench_ringbuffer(args):
+    from services.topology import benchmark
+    for scenario, result in benchmark().items():
+        print(f'{scenario}: {result}')
+
+
+def bench_logging(args):
+    from utils.logs import benchmark
+    for name, result in benchmark().items():
+        print(f'{name}: {result}')
+
+
+def bench_backtest(args):
+    from tradingalgo.backtest import benchmark
+    print(benchmark())
+
+
+def bench_rollup(args):
+    from models.rollup import benchmark
+    print(benchmark())
+
+
+def bench_orderbook(args):
+    from models.orderbook import benchmark
+    for levels in (10, 50, 100):
+        print(benchmark(levels))
+
+
+BENCHMARKS = {
+    'startup': bench_startup,
+    'orderbook': bench_orderbook,
+    'rollup': bench_rollup,
+    'ringbuffer': bench_ringbuffer,
+    'logging': bench_logging,
+    'backtest': bench_backtest,
+}
+
+
+def bench(args):
+    BENCHMARKS[args.target](args)
+
+
+def loadtest(args):
+    from services.loadgen import LoadGenerator
+    if args.dry_run:
+        return
+
+    generator = LoadGenerator(rates=args.rates, step_seconds=args.step_seconds,
+                              ticks_per_candle=args.ticks_per_candle)
+    report = generator.run(args.target)
+    for level in report['levels']:
+        print(level)
+    print(f'sustained={report["sustained_per_second"]:.0f} ticks/s '
+          f'lag_grows_from_rate={report["lag_grows_from_rate"]} final_lag_ms={report["final_lag_ms"]}')
+
+
+def sample(args):
+    print('### test ###')
+
+
+COMMANDS = {
+    'trade': trade,
+    'paper': paper,
+    'cluster': cluster,
+    'backtest': backtest,
+    'optimize': optimize,
+    'sweep': sweep,
+    'import': import_candles,
+    'rebuild': rebuild,
+    'retention': retention,
+    'partition': partition,
+    'init-db': init_db,
+    'loadtest': loadtest,
+}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='main.py')
+    subparsers = parser.add_subparsers(dest='command')
+
+    for name in COMMANDS:
+        sub = subparsers.add_parser(name)
+        sub.add_argument('--dry-run', action='store_true',
+                         help='import the command dependencies and exit')
+        sub.set_defaults(func=COMMANDS[name])
+        if name in ('backtest', 'optimize'):
+            sub.add_argument('--duration', default=settings.trade_duration)
+            sub.add_argument('--past-period', type=int, default=settings.past_period)
+        if name == 'sweep':
+            sub.add_argument('--past-periods', type=int, nargs='+',
+                             default=getattr(settings, 'sweep_past_periods', [settings.past_period]))
+            sub.add_argument('--metric', default=getattr(settings, 'sweep_metric', 'sharpe'))
+            sub.add_argument('--workers', type=int, default=None)
+            sub.add_argument('--compare-serial', action='store_true', help='time a serial run of the same jobs too')
+            sub.add_argument('durations', nargs='*', default=constants.DURATIONS_ALL)
+        if name == 'loadtest':
+            sub.add_argument('--target', choices=('parse', 'trade'), default='parse',
+                             help='trade runs AiTrade in back_test mode; use a scratch database')
+            sub.add_argument('--rates', type=int, nargs='+', default=[100, 200, 500, 1000, 2000])
+            sub.add_argument('--step-seconds', type=float, default=5.0)
+            sub.add_argument('--ticks-per-candle', type=int, default=50)
+        if name == 'import':
+            sub.add_argument('--periods', type=int, default=settings.past_period)
+            sub.add_argument('durations', nargs='*', default=settings.durations)
+        if name == 'partition':
+            sub.add_argument('durations', nargs='*', default=constants.DURATIONS_ALL)
+        if name == 'rebuild':
+            sub.add_argument('durations', nargs='*', default=constants.DURATIONS_ALL[1:])
+
+    sub = subparsers.add_parser('bench', help='run a benchmark (default: cold-start time per subcommand)')
+    sub.add_argument('--target', choices=list(BENCHMARKS), default='startup')
+    sub.add_argument('commands', nargs='*')
+    sub.set_defaults(func=bench)
+
+    # keep the historical positional modes working
+    if not argv or argv[0] == '0':
+        argv = ['trade']
+    elif argv[0] == '1':
+        return argparse.Namespace(func=sample)
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    args.func(args)
@@ -1,5 +1 @@
 from .base import init_db
-
-
-init_db()
-
@@ -1,14 +1,17 @@
 import datetime
 import logging
-import time
 
-import numpy as np
-import talib
 from models.candle import factory_candle_class
 from models.dfcandle import DataFrameCandle
 from models.events import SignalEvents
+from models.params import OptimizedParams
+from models.params import sweep_settings
+from models.window import RollingCandles
 from services.gmo_api import ApiClient
-from tradingalgo.algo import ichimoku_cloud
+from services.gmo_api import PrivateWebSocketApi
+from services.optimizer import OptimizeScheduler
+from tradingalgo.indicators import IndicatorCache
+from utils.profiling import profiled
 
 from config import settings
 from config import constants
@@ -17,28 +20,23 @@ logger = logging.getLogger(__name__)
 
 
 def duration_seconds(duration: str) -> int:
-    if duration == constants.DURATION_1M:
-        return 60
-    if duration == constants.DURATION_5M:
-        return 60 * 5
-    if duration == constants.DURATION_15M:
-        return 60 * 15
-    if duration == constants.DURATION_30M:
-        return 60 * 30
-    if duration == constants.DURATION_1H:
-        return 60 * 60
-    else:
-        return 0
+    return constants.DURATION_SECONDS.get(duration, 0)
 
 
 class AI(object):
-    def __init__(self, symbol, use_percent, duration, past_period, stop_limit_percent, back_test):
+    def __init__(self, symbol, use_percent, duration, past_period, stop_limit_percent, back_test,
+                 num_ranking=settings.num_ranking, window=None, optimizer=None, max_signals=None):
         self.API = ApiClient()
+        self.execution_stream = None
+        if not back_test and getattr(settings, 'use_execution_stream', True):
+            self.execution_stream = PrivateWebSocketApi(self.API)
+            self.execution_stream.start()
 
         if back_test:
-            self.signal_events = SignalEvents()
+            # long-running paper strategies bound the list; profit is kept as running sums
+            self.signal_events = SignalEvents(max_signals=max_signals)
         else:
-            self.signal_events = SignalEvents.get_signal_events_by_count(1)
+            self.signal_events = SignalEvents.get_signal_events_by_count(1, max_signals=1)
 
         self.symbol = symbol
         self.use_percent = use_percent
@@ -48,22 +46,90 @@ class AI(object):
         self.stop_limit = 0
         self.stop_limit_percent = stop_limit_percent
         self.back_test = back_test
+        self.num_ranking = num_ranking
         self.start_trade = datetime.datetime.utcnow()
         self.candle_cls = factory_candle_class(self.symbol, self.duration)
-        self.update_optimize_params(False)
+        # strategies on one feed share a window sized to the longest of them
+        self.window = window or RollingCandles(self.symbol, self.duration, self.past_period)
+        self.orderbook = None
+        if optimizer is not None:
+            # the owner of a shared scheduler loads cached params and runs the sweeps
+            self.optimizer = optimizer
+            return
+
+        self.optimizer = OptimizeScheduler(
+            self.update_optimize_params,
+            interval=getattr(settings, 'optimize_interval', 0),
+            timeout=getattr(settings, 'optimize_timeout', 0),
+            retry_interval=10 * duration_seconds(self.duration))
+        if self.load_optimize_params():
+            self.optimizer.start()
+            self.optimizer.request()
+        else:
+            self.optimizer.run_once()
+            self.optimizer.start()
+
+    def load_optimize_params(self):
+        cached = OptimizedParams.load(self.symbol, self.duration, self.past_period, self.sweep_settings())
+        if cached is None:
+            return False
 
-    def update_optimize_params(self, is_continue: bool):
+        latest = self.candle_cls.get_all_candles(1)
+        latest_time = latest[-1].time if latest else None
+        if not cached.is_fresh(latest_time, getattr(settings, 'params_max_lag', 10), self.sweep_settings()):
+            logger.info('action=load_optimize_params status=stale')
+            return False
+
+        self.optimized_trade_params = cached.trade_params
+        logger.info(f'action=load_optimize_params params={cached.params}')
+        return True
+
+    def sweep_settings(self):
+        return sweep_settings(self.stop_limit_percent, self.num_ranking)
+
+    def update_optimize_params(self, deadline=None, df=None):
         logger.info('action=update_optimize_params status=run')
+        if df is None:
+            df = self.window_frame()
+        if not df.candles:
+            return self.optimized_trade_params
+
+        try:
+            params = df.optimize_params(deadline, self.num_ranking, self.stop_limit_percent)
+        except TimeoutError:
+            logger.warning('action=update_optimize_params status=timeout')
+            return self.optimized_trade_params
+
+        if params is None:
+            # keep trading on the previous set; None makes the scheduler retry
+            logger.warning('action=update_optimize_params status=empty')
+            return None
+
+        # publish the new parameter set with a single reference swap
+        self.optimized_trade_params = params
+        logger.info(f'action=update_optimize_params params={params.__dict__}')
+        OptimizedParams.store(self.symbol, self.duration, self.past_period,
+                              df.candles[0].time, df.candles[-1].time, params, self.sweep_settings())
+        return params
+
+    def window_frame(self):
         df = DataFrameCandle(self.symbol, self.duration)
-        df.set_all_candles(self.past_period)
-        if df.candles:
-            self.optimized_trade_params = df.optimize_params()
-        if self.optimized_trade_params is not None:
-            logger.info(f'action=update_optimize_params params={self.optimized_trade_params.__dict__}')
+        df.candles = self.window.candles(self.past_period)
+        return df
+
+    def on_candle_closed(self, candle):
+        self.window.update(candle)
 
-        if is_continue and self.optimized_trade_params is None:
-            time.sleep(10 * duration_seconds(self.duration))
-            self.update_optimize_params(is_continue)
+    def execution_price(self, order_resp):
+        if self.execution_stream is not None and order_resp and 'data' in order_resp:
+            timeout = getattr(settings, 'execution_timeout', 5)
+            price = self.execution_stream.wait_price(order_resp['data'], timeout)
+            if price is not None:
+                return price
+            logger.warning(f'action=execution_price status=timeout order_id={order_resp["data"]}')
+
+        execution = self.API.get_contract_last_day()
+        return float(execution['data']['list'][0]['price'])
 
     def buy(self, candle):
         if self.back_test:
@@ -78,9 +144,8 @@ class AI(object):
             logger.warning('action=buy status=false error=previous_was_buy')
             return False
 
-        self.API.order(constants.BUY)
-        execution = self.API.get_contract_last_day()
-        price = float(execution['data']['list'][0]['price'])
+        resp = self.API.order(constants.BUY)
+        price = self.execution_price(resp)
         could_buy = self.signal_events.buy(candle.time, self.symbol, price, settings.size, save=True)
         return could_buy
 
@@ -97,38 +162,45 @@ class AI(object):
             logger.warning('action=buy status=false error=previous_was_sell')
             return False
 
-        self.API.order(constants.SELL)
-        execution = self.API.get_contract_last_day()
-        price = float(execution['data']['list'][0]['price'])
+        resp = self.API.order(constants.SELL)
+        price = self.execution_price(resp)
         could_sell = self.signal_events.sell(candle.time, self.symbol, price, settings.size, save=True)
         return could_sell
 
-    def trade(self):
+    @profiled('trade')
+    def trade(self, df=None, indicators=None):
         logger.info('action=trade status=run')
         params = self.optimized_trade_params
         if params is None:
             return
 
-        df = DataFrameCandle(self.symbol, self.duration)
-        df.set_all_candles(self.past_period)
+        if df is None:
+            df = self.window_frame()
+        if indicators is None:
+            indicators = IndicatorCache(df.closes)
+
+        # indicators may be shared with strategies looking at a longer window
+        offset = max(0, len(df.candles) - self.past_period)
+        candles = df.candles[offset:]
 
         if params.ema_enable:
-            ema_values_1 = talib.EMA(np.array(df.closes), params.ema_period_1)
-            ema_values_2 = talib.EMA(np.array(df.closes), params.ema_period_2)
+            ema_values_1 = indicators.ema(params.ema_period_1)[offset:]
+            ema_values_2 = indicators.ema(params.ema_period_2)[offset:]
 
         if params.bb_enable:
-            bb_up, _, bb_down = talib.BBANDS(np.array(df.closes), params.bb_n, params.bb_k, params.bb_k, 0)
+            bb_up, _, bb_down = [v[offset:] for v in indicators.bbands(params.bb_n, params.bb_k)]
 
         if params.ichimoku_enable:
-            tenkan, kijun, senkou_a, senkou_b, chikou = ichimoku_cloud(df.closes)
+            tenkan, kijun, senkou_a, senkou_b, chikou = [v[offset:] for v in indicators.ichimoku()]
 
         if params.rsi_enable:
-            rsi_values = talib.RSI(np.array(df.closes), params.rsi_period)
+            rsi_values = indicators.rsi(params.rsi_period)[offset:]
 
         if params.macd_enable:
-            macd, macd_signal, _ = talib.MACD(np.array(df.closes), params.macd_fast_period, params.macd_slow_period, params.macd_signal_period)
+            macd, macd_signal, _ = [v[offset:] for v in indicators.macd(
+                params.macd_fast_period, params.macd_slow_period, params.macd_signal_period)]
 
-        for i in range(1, len(df.candles)):
+        for i in range(1, len(candles)):
             buy_point, sell_point = 0, 0
 
             if params.ema_enable and params.ema_period_1 <= i and params.ema_period_2 <= i:
@@ -139,24 +211,24 @@ class AI(object):
                     sell_point += 1
 
             if params.bb_enable and params.bb_n <= i:
-                if bb_down[i-1] > df.candles[i-1].close and bb_down[i] <= df.candles[i].close:
+                if bb_down[i-1] > candles[i-1].close and bb_down[i] <= candles[i].close:
                     buy_point += 1
 
-                if bb_up[i-1] < df.candles[i-1].close and bb_up[i] >= df.candles[i].close:
+                if bb_up[i-1] < candles[i-1].close and bb_up[i] >= candles[i].close:
                     sell_point += 1
 
             if params.ichimoku_enable:
-                if (chikou[i-1] < df.candles[i-1].high and
-                        chikou[i] >= df.candles[i].high and
-                        senkou_a[i] < df.candles[i].low and
-                        senkou_b[i] < df.candles[i].low and
+                if (chikou[i-1] < candles[i-1].high and
+                        chikou[i] >= candles[i].high and
+                        senkou_a[i] < candles[i].low and
+                        senkou_b[i] < candles[i].low and
                         tenkan[i] > kijun[i]):
                     buy_point += 1
 
-                if (chikou[i-1] > df.candles[i-1].low and
-                        chikou[i] <= df.candles[i].low and
-                        senkou_a[i] > df.candles[i].high and
-                        senkou_b[i] > df.candles[i].high and
+                if (chikou[i-1] > candles[i-1].low and
+                        chikou[i] <= candles[i].low and
+                        senkou_a[i] > candles[i].high and
+                        senkou_b[i] > candles[i].high and
                         tenkan[i] < kijun[i]):
                     sell_point += 1
 
@@ -175,14 +247,14 @@ class AI(object):
                     sell_point += 1
 
             if buy_point > 0:
-                if not self.buy(df.candles[i]):
+                if not self.buy(candles[i]):
                     continue
 
-                self.stop_limit = df.candles[i].close * self.stop_limit_percent
+                self.stop_limit = candles[i].close * self.stop_limit_percent
 
-            if sell_point > 0 or self.stop_limit > df.candles[i].close:
-                if not self.sell(df.candles[i]):
+            if sell_point > 0 or self.stop_limit > candles[i].close:
+                if not self.sell(candles[i]):
                     continue
 
                 self.stop_limit = 0.0
-                self.update_optimize_params(is_continue=True)
+                self.optimizer.request()
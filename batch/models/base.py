@@ -8,12 +8,14 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm import scoped_session
 
 from config import settings
+from utils.prometheus import Histogram
 
 logger = logging.getLogger(__name__)
 Base = declarative_base()
 engine = create_engine(settings.database_url)
 Session = scoped_session(sessionmaker(bind=engine))
 lock = threading.Lock()
+LOCK_WAIT = Histogram('agm_session_lock_wait_seconds', 'Time spent waiting for the session_scope lock')
 
 
 @contextmanager
@@ -21,7 +23,8 @@ def session_scope():
     session = Session()
     session.expire_on_commit = False
     try:
-        lock.acquire()
+        with LOCK_WAIT.time():
+            lock.acquire()
         yield session
         session.commit()
     except Exception as e:
@@ -37,4 +40,5 @@ def session_scope():
 def init_db():
     from models import candle
     from models import events
+    from models import params
     Base.metadata.create_all(bind=engine)
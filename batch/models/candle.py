@@ -4,6 +4,7 @@ from sqlalchemy import Column
 from sqlalchemy import desc
 from sqlalchemy import DateTime
 from sqlalchemy import Float
+from sqlalchemy import func
 from sqlalchemy import Integer
 from sqlalchemy.exc import IntegrityError
 
@@ -51,6 +52,88 @@ class BaseCandleMixin(object):
         with session_scope() as session:
             session.add(self)
 
+    @classmethod
+    def upsert(cls, time, open, close, high, low, volume):
+        candle = cls(time=time,
+                     open=open,
+                     close=close,
+                     high=high,
+                     low=low,
+                     volume=volume)
+        with session_scope() as session:
+            session.merge(candle)
+        return candle
+
+    @classmethod
+    def get_rows_between(cls, start=None, end=None):
+        with session_scope() as session:
+            query = session.query(
+                cls.time, cls.open, cls.close, cls.high, cls.low, cls.volume)
+            if start is not None:
+                query = query.filter(cls.time >= start)
+            if end is not None:
+                query = query.filter(cls.time < end)
+            rows = query.order_by(cls.time).all()
+        return rows
+
+    @classmethod
+    def get_rows_page(cls, start, end, limit, inclusive=True):
+        with session_scope() as session:
+            query = session.query(
+                cls.time, cls.open, cls.close, cls.high, cls.low, cls.volume)
+            if start is not None:
+                query = query.filter(cls.time >= start if inclusive else cls.time > start)
+            if end is not None:
+                query = query.filter(cls.time < end)
+            rows = query.order_by(cls.time).limit(limit).all()
+        return rows
+
+    @classmethod
+    def get_times_between(cls, start, end):
+        with session_scope() as session:
+            rows = session.query(cls.time).filter(
+                cls.time >= start, cls.time < end).order_by(cls.time).all()
+        return [row.time for row in rows]
+
+    @classmethod
+    def bulk_upsert(cls, rows):
+        if not rows:
+            return 0
+        with session_scope() as session:
+            session.query(cls).filter(cls.time.in_([row['time'] for row in rows]))\
+                .delete(synchronize_session=False)
+            session.bulk_insert_mappings(cls, rows)
+        return len(rows)
+
+    @classmethod
+    def get_oldest_time(cls):
+        with session_scope() as session:
+            return session.query(func.min(cls.time)).scalar()
+
+    @classmethod
+    def delete_between(cls, start, end):
+        with session_scope() as session:
+            return session.query(cls).filter(cls.time >= start, cls.time < end)\
+                .delete(synchronize_session=False)
+
+    @classmethod
+    def replace_between(cls, start, end, rows):
+        with session_scope() as session:
+            session.query(cls).filter(cls.time >= start, cls.time < end)\
+                .delete(synchronize_session=False)
+            session.bulk_insert_mappings(cls, rows)
+        return len(rows)
+
+    @classmethod
+    def get_latest_rows(cls, limit=100):
+        # plain rows are not tracked by the session, unlike get_all_candles
+        with session_scope() as session:
+            rows = session.query(
+                cls.time, cls.open, cls.close, cls.high, cls.low, cls.volume)\
+                .order_by(desc(cls.time)).limit(limit).all()
+        rows.reverse()
+        return rows
+
     @classmethod
     def get_all_candles(cls, limit=100):
         with session_scope() as session:
@@ -108,23 +191,3 @@ def factory_candle_class(symbol, duration):
         if duration == constants.DURATION_1H:
             return BtcBaseCandle1H
 
-
-def create_candle_with_duration(symbol, duration, ticker):
-    cls = factory_candle_class(symbol, duration)
-    ticker_time = ticker.truncate_date_time(duration)
-    current_candle = cls.get(ticker_time)
-    price = ticker.last
-    # price = ticker.mid_price
-
-    if current_candle is None:
-        cls.create(ticker_time, price, price, price, price, ticker.volume)
-        return True
-
-    if current_candle.high <= price:
-        current_candle.high = price
-    elif current_candle.low >= price:
-        current_candle.low = price
-    current_candle.volume = ticker.volume
-    current_candle.close = price
-    current_candle.save()
-    return False
@@ -1,12 +1,33 @@
+import time
+
 from dict2obj import Dict2Obj
 import numpy as np
 import talib
 
 from models.candle import factory_candle_class
 from models.events import SignalEvents
+from models.window import CandleColumns
+from utils.profiling import profiled
 from utils.utils import Serializer
 from tradingalgo.algo import ichimoku_cloud
-from config import settings
+from tradingalgo.backtest import CombinedBacktest
+from tradingalgo.backtest import rules_to_params
+from tradingalgo.metrics import rank_score
+from config import settings, constants
+
+
+DEFAULT_PARAMS = {
+    'ema_period_1': 7,
+    'ema_period_2': 14,
+    'bb_n': 20,
+    'bb_k': 2.0,
+    'rsi_period': 14,
+    'rsi_buy_thread': 30.0,
+    'rsi_sell_thread': 70.0,
+    'macd_fast_period': 12,
+    'macd_slow_period': 26,
+    'macd_signal_period': 9,
+}
 
 
 def nan_to_zero(values: np.asarray):
@@ -91,11 +112,29 @@ class DataFrameCandle(object):
         self.macd = Macd(0, 0, 0, [], [], [])
         self.adx = Adx(0, [], [], [])
         self.events = SignalEvents()
+        self.rank_metric = getattr(settings, 'rank_metric', 'profit')
+        self._arrays = None
 
     def set_all_candles(self, limit=1000):
         self.candles = self.candle_cls.get_all_candles(limit)
+        self._arrays = None
+        return self.candles
+
+    def set_latest_rows(self, limit=1000):
+        self.candles = self.candle_cls.get_latest_rows(limit)
+        self._arrays = None
         return self.candles
 
+    def score(self, signal_events):
+        if self.rank_metric == 'profit':
+            return signal_events.profit
+        if self._arrays is None:
+            self._arrays = (np.array(self.times, dtype='datetime64[s]'),
+                            np.array(self.closes, dtype=np.float64))
+        times, closes = self._arrays
+        metrics = signal_events.metrics(times, closes, constants.DURATION_SECONDS[self.duration])
+        return rank_score(metrics, self.rank_metric)
+
     @property
     def values(self):
         return {
@@ -113,6 +152,8 @@ class DataFrameCandle(object):
 
     @property
     def times(self):
+        if isinstance(self.candles, CandleColumns):
+            return self.candles.columns['time']
         values = []
         for candle in self.candles:
             values.append(candle.time)
@@ -120,6 +161,8 @@ class DataFrameCandle(object):
 
     @property
     def opens(self):
+        if isinstance(self.candles, CandleColumns):
+            return self.candles.columns['open']
         values = []
         for candle in self.candles:
             values.append(candle.open)
@@ -127,6 +170,8 @@ class DataFrameCandle(object):
 
     @property
     def closes(self):
+        if isinstance(self.candles, CandleColumns):
+            return self.candles.columns['close']
         values = []
         for candle in self.candles:
             values.append(candle.close)
@@ -134,6 +179,8 @@ class DataFrameCandle(object):
 
     @property
     def highs(self):
+        if isinstance(self.candles, CandleColumns):
+            return self.candles.columns['high']
         values = []
         for candle in self.candles:
             values.append(candle.high)
@@ -141,6 +188,8 @@ class DataFrameCandle(object):
 
     @property
     def lows(self):
+        if isinstance(self.candles, CandleColumns):
+            return self.candles.columns['low']
         values = []
         for candle in self.candles:
             values.append(candle.low)
@@ -165,9 +214,9 @@ class DataFrameCandle(object):
     def add_bbands(self, n: int, k: float):
         if n <= len(self.closes):
             up, mid, down = talib.BBANDS(np.asarray(self.closes), n, k, k, 0)
-            up_list = nan_to_zero(up).to_list()
-            mid_list = nan_to_zero(mid).to_list()
-            down_list = nan_to_zero(down).to_list()
+            up_list = nan_to_zero(up).tolist()
+            mid_list = nan_to_zero(mid).tolist()
+            down_list = nan_to_zero(down).tolist()
             self.bbands = BBands(n, k, up_list, mid_list, down_list)
             return True
         return False
@@ -243,7 +292,7 @@ class DataFrameCandle(object):
                 signal_events = self.back_test_ema(period_1, period_2)
                 if signal_events is None:
                     continue
-                profit = signal_events.profit
+                profit = self.score(signal_events)
                 if performance < profit:
                     performance = profit
                     best_period_1 = period_1
@@ -280,7 +329,7 @@ class DataFrameCandle(object):
                 signal_events = self.back_test_bb(n, k)
                 if signal_events is None:
                     continue
-                profit = signal_events.profit
+                profit = self.score(signal_events)
                 if performance < profit:
                     performance = profit
                     best_n = n
@@ -310,7 +359,7 @@ class DataFrameCandle(object):
         signal_events = self.back_test_ichimoku()
         if signal_events is None:
             return 0.0
-        return signal_events.profit
+        return self.score(signal_events)
 
     def back_test_rsi(self, period: int, buy_thread: float, sell_thread: float):
         if len(self.candles) <= period:
@@ -343,7 +392,7 @@ class DataFrameCandle(object):
                     signal_events = self.back_test_rsi(period, buy_thread, sell_thread)
                     if signal_events is None:
                         continue
-                    profit = signal_events.profit
+                    profit = self.score(signal_events)
                     if performance < profit:
                         performance = profit
                         best_period = period
@@ -380,7 +429,7 @@ class DataFrameCandle(object):
                     signal_events = self.back_test_macd(fast_period, slow_period, signal_period)
                     if signal_events is None:
                         continue
-                    profit = signal_events.profit
+                    profit = self.score(signal_events)
                     if performance < profit:
                         performance = profit
                         best_macd_fast_period = fast_period
@@ -389,12 +438,36 @@ class DataFrameCandle(object):
 
         return performance, best_macd_fast_period, best_macd_slow_period, best_macd_signal_period
 
-    def optimize_params(self):
+    @staticmethod
+    def check_deadline(deadline):
+        if deadline is not None and time.monotonic() > deadline:
+            raise TimeoutError('optimize_params exceeded its time budget')
+
+    def optimize_combined(self, stop_limit_percent, deadline=None, num_ranking=settings.num_ranking):
+        backtest = CombinedBacktest(
+            self.closes, self.highs, self.lows, stop_limit_percent,
+            duration_seconds=constants.DURATION_SECONDS[self.duration], rank_metric=self.rank_metric)
+        performance, rules = backtest.optimize(num_ranking, deadline=deadline, check_deadline=self.check_deadline)
+        if rules is None:
+            return None
+        return Dict2Obj(rules_to_params(rules, DEFAULT_PARAMS))
+
+    @profiled('optimize_params')
+    def optimize_params(self, deadline=None, num_ranking=settings.num_ranking, stop_limit_percent=None):
+        # 'combined' ranks the rule set AI.trade actually runs, stop limit included
+        if stop_limit_percent is not None and getattr(settings, 'optimize_mode', 'family') == 'combined':
+            return self.optimize_combined(stop_limit_percent, deadline, num_ranking)
+
         ema_performance, ema_period_1, ema_period_2 = self.optimize_ema()
+        self.check_deadline(deadline)
         bb_performance, bb_n, bb_k = self.optimize_bb()
+        self.check_deadline(deadline)
         ichimoku_performance  = self.optimize_ichimoku()
+        self.check_deadline(deadline)
         rsi_performance, rsi_period, rsi_buy_thread, rsi_sell_thread = self.optimize_rsi()
+        self.check_deadline(deadline)
         macd_performance, macd_fast_period, macd_slow_period, macd_signal_period = self.optimize_macd()
+        self.check_deadline(deadline)
 
         ema_ranking = Dict2Obj({'performance': ema_performance, 'enable': False})
         bb_ranking = Dict2Obj({'performance': bb_performance, 'enable': False})
@@ -407,7 +480,7 @@ class DataFrameCandle(object):
 
         is_enable = False
         for i, ranking in enumerate(rankings):
-            if i >= settings.num_ranking:
+            if i >= num_ranking:
                 break
 
             if ranking.performance > 0:
@@ -1,5 +1,6 @@
 import datetime
 
+import numpy as np
 import omitempty
 from sqlalchemy import Column
 from sqlalchemy import desc
@@ -11,6 +12,9 @@ from sqlalchemy import String
 from models.base import Base
 from models.base import session_scope
 
+from tradingalgo.metrics import compute_metrics
+from tradingalgo.metrics import positions_from_signals
+
 from config import settings, constants
 
 
@@ -50,6 +54,17 @@ class SignalEvent(Base):
             rows.reverse()
             return rows
 
+    @classmethod
+    def get_rows_between(cls, start=None, end=None, symbol=settings.symbol):
+        with session_scope() as session:
+            query = session.query(cls.time, cls.side, cls.price, cls.size)\
+                .filter(cls.symbol == symbol)
+            if start is not None:
+                query = query.filter(cls.time >= start)
+            if end is not None:
+                query = query.filter(cls.time < end)
+            return query.order_by(cls.time).all()
+
     @classmethod
     def get_signal_events_after_time(cls, time):
         with session_scope() as session:
@@ -60,11 +75,42 @@ class SignalEvent(Base):
 
 
 class SignalEvents(object):
-    def __init__(self, signals=None):
+    def __init__(self, signals=None, max_signals=None):
         if signals is None:
             self.signals = []
         else:
             self.signals = signals
+        # live trading only needs the last signal; profit is kept as running sums
+        self.max_signals = max_signals
+        self.count = 0
+        self.total = 0.0
+        self.before_sell = 0.0
+        self.is_holding = False
+        for signal_event in self.signals:
+            self.accumulate(signal_event)
+        self.trim()
+
+    def accumulate(self, signal_event):
+        first = self.count == 0
+        self.count += 1
+        if first and signal_event.side == constants.SELL:
+            return
+        if signal_event.side == constants.BUY:
+            self.total -= signal_event.price * signal_event.size
+            self.is_holding = True
+        if signal_event.side == constants.SELL:
+            self.total += signal_event.price * signal_event.size
+            self.is_holding = False
+            self.before_sell = self.total
+
+    def append(self, signal_event):
+        self.signals.append(signal_event)
+        self.accumulate(signal_event)
+        self.trim()
+
+    def trim(self):
+        if self.max_signals is not None and len(self.signals) > self.max_signals:
+            del self.signals[:-self.max_signals]
 
     def can_buy(self, time):
         if len(self.signals) == 0:
@@ -95,7 +141,7 @@ class SignalEvents(object):
         if save:
             signal_event.save()
 
-        self.signals.append(signal_event)
+        self.append(signal_event)
         return True
 
     def sell(self, time, symbol, price, size, save):
@@ -108,13 +154,13 @@ class SignalEvents(object):
         if save:
             signal_event.save()
 
-        self.signals.append(signal_event)
+        self.append(signal_event)
         return True
 
     @staticmethod
-    def get_signal_events_by_count(count: int):
+    def get_signal_events_by_count(count: int, max_signals=None):
         signal_events = SignalEvent.get_signal_events_by_count(count)
-        return SignalEvents(signal_events)
+        return SignalEvents(signal_events, max_signals)
 
     @staticmethod
     def get_signal_events_after_time(time: datetime.datetime.time):
@@ -123,23 +169,21 @@ class SignalEvents(object):
 
     @property
     def profit(self):
-        total = 0.0
-        before_sell = 0.0
-        is_holding = False
-        for i in range(len(self.signals)):
-            signal_event = self.signals[i]
-            if i == 0 and signal_event.side == constants.SELL:
-                continue
-            if signal_event.side == constants.BUY:
-                total -= signal_event.price * signal_event.size
-                is_holding = True
-            if signal_event.side == constants.SELL:
-                total += signal_event.price * signal_event.size
-                is_holding = False
-                before_sell = total
-        if is_holding:
-            return before_sell
-        return total
+        if self.is_holding:
+            return self.before_sell
+        return self.total
+
+    def metrics(self, times, closes, duration_seconds):
+        is_buy = np.array([s.side == constants.BUY for s in self.signals], dtype=bool)
+        amounts = np.array([s.price * s.size for s in self.signals], dtype=np.float64)
+        positions = positions_from_signals(times, [s.time for s in self.signals], is_buy)
+
+        # pair BUY/SELL round trips the same way profit does
+        start = 1 if len(is_buy) and not is_buy[0] else 0
+        count = (len(is_buy) - start) // 2 * 2
+        entries = amounts[start:start + count:2]
+        exits = amounts[start + 1:start + count:2]
+        return compute_metrics(closes, positions, duration_seconds, entries, exits)
 
     @property
     def value(self):
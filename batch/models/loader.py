@@ -0,0 +1,158 @@
+from collections import OrderedDict
+import datetime
+import logging
+import os
+
+import numpy as np
+
+from models.candle import factory_candle_class
+from models.events import SignalEvent
+from models.retention import month_start
+from models.retention import next_month
+from utils.utils import jst_now
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+CANDLE_COLUMNS = ('time', 'open', 'close', 'high', 'low', 'volume')
+SIGNAL_COLUMNS = ('time', 'side', 'price', 'size')
+
+
+def to_columns(rows, columns=CANDLE_COLUMNS):
+    if not rows:
+        return empty_columns(columns)
+    values = list(zip(*rows))
+    result = {'time': np.array(values[0], dtype='datetime64[s]')}
+    for name, column in zip(columns[1:], values[1:]):
+        if name == 'side':
+            result[name] = np.array(column)
+        else:
+            result[name] = np.array([np.nan if v is None else v for v in column], dtype=np.float64)
+    return result
+
+
+def empty_columns(columns=CANDLE_COLUMNS):
+    result = {'time': np.array([], dtype='datetime64[s]')}
+    for name in columns[1:]:
+        result[name] = np.array([], dtype=object if name == 'side' else np.float64)
+    return result
+
+
+def concat_columns(chunks, columns=CANDLE_COLUMNS):
+    if not chunks:
+        return empty_columns(columns)
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in columns}
+
+
+def slice_columns(data, start=None, end=None):
+    times = data['time']
+    lo = 0 if start is None else np.searchsorted(times, np.datetime64(start, 's'))
+    hi = len(times) if end is None else np.searchsorted(times, np.datetime64(end, 's'))
+    return {name: values[lo:hi] for name, values in data.items()}
+
+
+def to_frame(data):
+    import pandas as pd
+    return pd.DataFrame(data)
+
+
+def to_candles(data):
+    from models.window import WindowCandle
+    return [WindowCandle(*row) for row in zip(
+        data['time'].astype(datetime.datetime), data['open'].tolist(), data['close'].tolist(),
+        data['high'].tolist(), data['low'].tolist(), data['volume'].tolist())]
+
+
+def iter_candle_chunks(symbol, duration, start=None, end=None, chunk_size=100000):
+    cls = factory_candle_class(symbol, duration)
+    cursor, inclusive = start, True
+    while True:
+        rows = cls.get_rows_page(cursor, end, chunk_size, inclusive)
+        if not rows:
+            return
+        yield to_columns(rows)
+        if len(rows) < chunk_size:
+            return
+        cursor, inclusive = rows[-1].time, False
+
+
+class CandleLoader(object):
+    def __init__(self, symbol=settings.symbol, cache_dir=None, chunk_size=100000, max_months=24):
+        self.symbol = symbol
+        self.cache_dir = cache_dir
+        self.chunk_size = chunk_size
+        # least recently used complete months first; older ones fall back to Parquet or the DB
+        self.memory = OrderedDict()
+        self.max_months = max_months
+
+    def cache_path(self, duration, month):
+        return os.path.join(self.cache_dir, f'{self.symbol}_{duration}_{month:%Y%m}.parquet')
+
+    def fetch(self, duration, start, end):
+        return concat_columns(list(iter_candle_chunks(
+            self.symbol, duration, start, end, self.chunk_size)))
+
+    def load_month(self, duration, month, now):
+        key = (duration, month)
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return self.memory[key]
+
+        # only complete months are cached, the current one is always refetched
+        complete = next_month(month) <= now
+        if complete and self.cache_dir and os.path.exists(self.cache_path(duration, month)):
+            data = self.read_parquet(self.cache_path(duration, month))
+        else:
+            data = self.fetch(duration, month, next_month(month))
+            if complete and self.cache_dir:
+                self.write_parquet(data, self.cache_path(duration, month))
+        if complete and self.max_months:
+            self.memory[key] = data
+            while len(self.memory) > self.max_months:
+                self.memory.popitem(last=False)
+        return data
+
+    def load(self, duration, start=None, end=None):
+        now = jst_now()
+        if start is None:
+            start = factory_candle_class(self.symbol, duration).get_oldest_time()
+            if start is None:
+                return empty_columns()
+        end = end or now
+
+        chunks = []
+        month = month_start(start)
+        while month < end:
+            chunks.append(self.load_month(duration, month, now))
+            month = next_month(month)
+        return slice_columns(concat_columns(chunks), start, end)
+
+    def load_frame(self, duration, start=None, end=None):
+        return to_frame(self.load(duration, start, end))
+
+    def load_signal_events(self, start=None, end=None):
+        rows = SignalEvent.get_rows_between(start, end, self.symbol)
+        return to_columns(rows, SIGNAL_COLUMNS)
+
+    def load_signal_events_frame(self, start=None, end=None):
+        return to_frame(self.load_signal_events(start, end))
+
+    @staticmethod
+    def write_parquet(data, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        pq.write_table(pa.table(data), path)
+
+    @staticmethod
+    def read_parquet(path):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+
+    def export_parquet(self, duration, path, start=None, end=None):
+        data = self.load(duration, start, end)
+        self.write_parquet(data, path)
+        logger.info(f'action=export_parquet duration={duration} rows={len(data["time"])} path={path}')
+        return len(data['time'])
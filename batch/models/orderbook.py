@@ -0,0 +1,110 @@
+from collections import namedtuple
+import time
+import tracemalloc
+
+import numpy as np
+
+# one published state of the book; update() builds a new one and never mutates it
+BookSnapshot = namedtuple('BookSnapshot', (
+    'ask_prices', 'ask_sizes', 'bid_prices', 'bid_sizes', 'ask_total', 'bid_total', 'levels', 'timestamp'))
+EMPTY = BookSnapshot(np.zeros(0), np.zeros(0), np.zeros(0), np.zeros(0), 0.0, 0.0, {}, None)
+
+
+class OrderBook(object):
+    def __init__(self, symbol, depth=100):
+        self.symbol = symbol
+        self.depth = depth
+        self.updates = 0
+        self.snapshot = EMPTY
+
+    def _side(self, levels, index):
+        levels = levels[:self.depth]
+        prices = np.array([float(level['price']) for level in levels])
+        sizes = np.array([float(level['size']) for level in levels])
+        # price -> size over both sides
+        index.update(zip(prices.tolist(), sizes.tolist()))
+        return prices, sizes
+
+    def update(self, message):
+        levels = {}
+        ask_prices, ask_sizes = self._side(message['asks'], levels)
+        bid_prices, bid_sizes = self._side(message['bids'], levels)
+        # strategy threads read the book while the websocket thread updates it; they see
+        # the previous snapshot or this one, never a mix of both
+        self.snapshot = BookSnapshot(ask_prices, ask_sizes, bid_prices, bid_sizes,
+                                     float(ask_sizes.sum()), float(bid_sizes.sum()),
+                                     levels, message.get('timestamp'))
+        self.updates += 1
+
+    @property
+    def timestamp(self):
+        return self.snapshot.timestamp
+
+    @property
+    def levels(self):
+        return self.snapshot.levels
+
+    @property
+    def best_ask(self):
+        prices = self.snapshot.ask_prices
+        return prices[0] if len(prices) else None
+
+    @property
+    def best_bid(self):
+        prices = self.snapshot.bid_prices
+        return prices[0] if len(prices) else None
+
+    @property
+    def mid(self):
+        snapshot = self.snapshot
+        if not len(snapshot.ask_prices) or not len(snapshot.bid_prices):
+            return None
+        return (snapshot.ask_prices[0] + snapshot.bid_prices[0]) / 2
+
+    @property
+    def spread(self):
+        snapshot = self.snapshot
+        if not len(snapshot.ask_prices) or not len(snapshot.bid_prices):
+            return None
+        return snapshot.ask_prices[0] - snapshot.bid_prices[0]
+
+    @property
+    def imbalance(self):
+        snapshot = self.snapshot
+        total = snapshot.bid_total + snapshot.ask_total
+        if total == 0:
+            return 0.0
+        return (snapshot.bid_total - snapshot.ask_total) / total
+
+    def depth_at(self, price):
+        return self.snapshot.levels.get(float(price), 0.0)
+
+
+def sample_message(levels, mid=5000000.0):
+    return {
+        'channel': 'orderbooks',
+        'asks': [{'price': str(mid + i + 1), 'size': '0.01'} for i in range(levels)],
+        'bids': [{'price': str(mid - i - 1), 'size': '0.02'} for i in range(levels)],
+        'symbol': 'BTC',
+        'timestamp': '2021-06-19T00:00:00.000Z',
+    }
+
+
+def benchmark(levels=100, messages=10000):
+    message = sample_message(levels)
+    tracemalloc.start()
+    book = OrderBook('BTC', depth=levels)
+    book.update(message)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(messages):
+        book.update(message)
+    update = (time.perf_counter() - start) / messages
+
+    start = time.perf_counter()
+    for _ in range(messages):
+        book.mid, book.spread, book.imbalance
+    query = (time.perf_counter() - start) / messages
+    return {'levels': levels, 'memory_bytes': memory, 'update_us': update * 1e6, 'query_us': query * 1e6}
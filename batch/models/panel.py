@@ -0,0 +1,76 @@
+import datetime
+import logging
+
+import numpy as np
+
+from models.candle import factory_candle_class
+from models.loader import CANDLE_COLUMNS
+from models.loader import to_columns
+from models.rollup import resample
+from models.rollup import truncate_time
+from tradingalgo.indicators import IndicatorCache
+from utils.utils import jst_now
+
+from config import settings, constants
+
+logger = logging.getLogger(__name__)
+
+
+# indicators are requested as tuples naming an IndicatorCache method and its
+# arguments, e.g. ('ema', 7), ('bbands', 20, 2.0) or ('ichimoku',)
+class IndicatorPanel(object):
+    def __init__(self, symbol=settings.symbol, durations=None, past_period=settings.past_period):
+        self.symbol = symbol
+        self.durations = durations or constants.DURATIONS_ALL
+        self.past_period = past_period
+        self.frames = {}
+        self.caches = {}
+
+    @property
+    def widest(self):
+        return max(self.durations, key=constants.DURATION_SECONDS.get)
+
+    def window_start(self, end):
+        span = datetime.timedelta(seconds=constants.DURATION_SECONDS[self.widest] * self.past_period)
+        # start on a bucket boundary so the oldest candle of every timeframe is complete
+        return truncate_time(end - span, self.widest)
+
+    def load(self, end=None):
+        end = end or jst_now()
+        rows = factory_candle_class(self.symbol, constants.DURATION_1M).get_rows_between(
+            self.window_start(end), end)
+        self.set_columns(to_columns(rows))
+        return self
+
+    def set_columns(self, data):
+        volumes = np.nan_to_num(data['volume'])
+        self.frames = {}
+        for duration in self.durations:
+            if duration == constants.DURATION_1M:
+                columns = (data['time'], data['open'], data['close'], data['high'], data['low'], volumes)
+            else:
+                columns = resample(data['time'], data['open'], data['close'],
+                                   data['high'], data['low'], volumes, duration)
+            self.frames[duration] = {
+                name: values[-self.past_period:] for name, values in zip(CANDLE_COLUMNS, columns)}
+        self.caches = {
+            duration: IndicatorCache(frame['close']) for duration, frame in self.frames.items()}
+        return self
+
+    def compute(self, indicators, durations=None):
+        result = {}
+        for duration in durations or self.durations:
+            cache = self.caches[duration]
+            result[duration] = {
+                spec: getattr(cache, spec[0])(*spec[1:]) for spec in indicators}
+        return result
+
+    def latest(self, indicators, durations=None):
+        def last(value):
+            if isinstance(value, tuple):
+                return tuple(last(v) for v in value)
+            return float(value[-1]) if len(value) else None
+
+        return {
+            duration: {spec: last(value) for spec, value in values.items()}
+            for duration, values in self.compute(indicators, durations).items()}
@@ -0,0 +1,103 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+
+from dict2obj import Dict2Obj
+from sqlalchemy import Column
+from sqlalchemy import DateTime
+from sqlalchemy import Integer
+from sqlalchemy import String
+from sqlalchemy import Text
+
+from models.base import Base
+from models.base import session_scope
+
+from config import settings, constants
+
+logger = logging.getLogger(__name__)
+
+OPTIMIZER_SOURCES = ('models/dfcandle.py', 'tradingalgo/algo.py', 'tradingalgo/backtest.py',
+                     'tradingalgo/indicators.py', 'tradingalgo/metrics.py')
+
+
+def optimizer_version():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    digest = hashlib.sha1()
+    for path in OPTIMIZER_SOURCES:
+        with open(os.path.join(root, path), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+CODE_VERSION = optimizer_version()
+
+
+def sweep_settings(stop_limit_percent, num_ranking, rank_metric=None):
+    # everything besides the candles and the code that decides which params a sweep returns
+    return {
+        'optimize_mode': getattr(settings, 'optimize_mode', 'family'),
+        'rank_metric': rank_metric or getattr(settings, 'rank_metric', 'profit'),
+        'stop_limit_percent': stop_limit_percent,
+        'num_ranking': num_ranking,
+    }
+
+
+def sweep_key(sweep):
+    return hashlib.sha1(json.dumps(sweep, sort_keys=True).encode()).hexdigest()[:12]
+
+
+class OptimizedParams(Base):
+    __tablename__ = 'OPTIMIZED_PARAMS'
+
+    symbol = Column(String, primary_key=True, nullable=False)
+    duration = Column(String, primary_key=True, nullable=False)
+    past_period = Column(Integer, primary_key=True, nullable=False)
+    # strategies that only differ in their sweep settings keep separate rows
+    sweep_key = Column(String, primary_key=True, nullable=False)
+    code_version = Column(String, nullable=False)
+    sweep = Column(Text, nullable=False)
+    first_time = Column(DateTime, nullable=False)
+    last_time = Column(DateTime, nullable=False)
+    params = Column(Text, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+    @classmethod
+    def store(cls, symbol, duration, past_period, first_time, last_time, params, sweep):
+        row = cls(symbol=symbol,
+                  duration=duration,
+                  past_period=past_period,
+                  sweep_key=sweep_key(sweep),
+                  code_version=CODE_VERSION,
+                  sweep=json.dumps(sweep, sort_keys=True),
+                  first_time=first_time,
+                  last_time=last_time,
+                  params=json.dumps(params.__dict__, default=float),
+                  updated_at=datetime.datetime.utcnow())
+        with session_scope() as session:
+            session.merge(row)
+        return row
+
+    @classmethod
+    def load(cls, symbol, duration, past_period, sweep):
+        with session_scope() as session:
+            row = session.query(cls).filter(
+                cls.symbol == symbol,
+                cls.duration == duration,
+                cls.past_period == past_period,
+                cls.sweep_key == sweep_key(sweep)).first()
+        return row
+
+    def is_fresh(self, latest_time, max_lag_candles, sweep):
+        if self.code_version != CODE_VERSION or latest_time is None:
+            return False
+        if json.loads(self.sweep) != sweep:
+            return False
+        max_lag = datetime.timedelta(
+            seconds=constants.DURATION_SECONDS[self.duration] * max_lag_candles)
+        return latest_time - self.last_time <= max_lag
+
+    @property
+    def trade_params(self):
+        return Dict2Obj(json.loads(self.params))
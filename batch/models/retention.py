@@ -0,0 +1,182 @@
+import datetime
+import logging
+import threading
+
+from sqlalchemy import text
+
+from models.base import engine
+from models.base import session_scope
+from models.candle import factory_candle_class
+from models.rollup import rebuild_candles
+from models.rollup import truncate_time
+from utils.utils import jst_now
+
+from config import settings, constants
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETENTION_DAYS = {
+    constants.DURATION_1M: 90,
+    constants.DURATION_5M: 365,
+    constants.DURATION_15M: None,
+    constants.DURATION_30M: None,
+    constants.DURATION_1H: None,
+}
+
+
+def is_postgresql():
+    return engine.dialect.name == 'postgresql'
+
+
+def month_start(time):
+    return datetime.datetime(time.year, time.month, 1)
+
+
+def next_month(time):
+    if time.month == 12:
+        return datetime.datetime(time.year + 1, 1, 1)
+    return datetime.datetime(time.year, time.month + 1, 1)
+
+
+def partition_name(table, start):
+    return f'{table}_{start:%Y%m}'
+
+
+def is_partitioned(table):
+    if not is_postgresql():
+        return False
+    with session_scope() as session:
+        row = session.execute(text(
+            'SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid '
+            'WHERE c.relname = :name'), {'name': table}).first()
+    return row is not None
+
+
+def list_partitions(table):
+    with session_scope() as session:
+        rows = session.execute(text(
+            'SELECT c.relname FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid '
+            'JOIN pg_class p ON p.oid = i.inhparent '
+            'WHERE p.relname = :name'), {'name': table}).all()
+    partitions = {}
+    for (name,) in rows:
+        suffix = name[len(table) + 1:]
+        if suffix.isdigit() and len(suffix) == 6:
+            partitions[name] = datetime.datetime(int(suffix[:4]), int(suffix[4:]), 1)
+    return partitions
+
+
+def create_partition(session, table, start):
+    session.execute(text(
+        f'CREATE TABLE IF NOT EXISTS "{partition_name(table, start)}" PARTITION OF "{table}" '
+        f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{next_month(start):%Y-%m-%d}')"))
+
+
+def ensure_partitions(table, until):
+    start = month_start(jst_now())
+    with session_scope() as session:
+        while start <= until:
+            create_partition(session, table, start)
+            start = next_month(start)
+
+
+def convert_to_partitioned(cls, months_ahead=2):
+    table = cls.__tablename__
+    if not is_postgresql() or is_partitioned(table):
+        return False
+
+    oldest = cls.get_oldest_time() or jst_now()
+    until = jst_now() + datetime.timedelta(days=31 * months_ahead)
+    with session_scope() as session:
+        session.execute(text(f'ALTER TABLE "{table}" RENAME TO "{table}_old"'))
+        session.execute(text(f'ALTER TABLE "{table}_old" RENAME CONSTRAINT "{table}_pkey" TO "{table}_old_pkey"'))
+        session.execute(text(
+            f'CREATE TABLE "{table}" (LIKE "{table}_old" INCLUDING DEFAULTS) PARTITION BY RANGE (time)'))
+        session.execute(text(f'ALTER TABLE "{table}" ADD PRIMARY KEY (time)'))
+        start = month_start(oldest)
+        while start <= until:
+            create_partition(session, table, start)
+            start = next_month(start)
+        session.execute(text(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT'))
+        session.execute(text(f'INSERT INTO "{table}" SELECT * FROM "{table}_old"'))
+        session.execute(text(f'DROP TABLE "{table}_old"'))
+    logger.info(f'action=convert_to_partitioned table={table}')
+    return True
+
+
+class RetentionManager(object):
+    def __init__(self, symbol=settings.symbol, retention_days=None,
+                 batch=datetime.timedelta(days=1), months_ahead=2):
+        self.symbol = symbol
+        self.retention_days = retention_days or getattr(settings, 'retention_days', DEFAULT_RETENTION_DAYS)
+        self.batch = batch
+        self.months_ahead = months_ahead
+        self._stop = threading.Event()
+
+    def cutoff(self, duration, now):
+        days = self.retention_days.get(duration)
+        if days is None:
+            return None
+        # align to the widest bucket so compaction never rebuilds a partial candle
+        return truncate_time(now - datetime.timedelta(days=days), constants.DURATIONS_ALL[-1])
+
+    def compact(self, cls, cutoff):
+        oldest = cls.get_oldest_time()
+        if oldest is None or oldest >= cutoff:
+            return
+        for duration in constants.DURATIONS_ALL[1:]:
+            start = oldest
+            while start < cutoff:
+                end = min(start + self.batch, cutoff)
+                rebuild_candles(self.symbol, duration, start, end)
+                start = end
+
+    def prune(self, cls, cutoff):
+        table = cls.__tablename__
+        removed = 0
+        if is_partitioned(table):
+            for name, start in list_partitions(table).items():
+                if next_month(start) <= cutoff:
+                    with session_scope() as session:
+                        session.execute(text(f'DROP TABLE "{name}"'))
+                    logger.info(f'action=prune table={table} partition={name}')
+
+        # delete the remainder in small batches so ingestion only waits on the lock briefly
+        start = cls.get_oldest_time()
+        while start is not None and start < cutoff:
+            end = min(start + self.batch, cutoff)
+            removed += cls.delete_between(start, end)
+            start = end
+        return removed
+
+    def run_once(self, now=None):
+        now = now or jst_now()
+        until = now + datetime.timedelta(days=31 * self.months_ahead)
+        report = {}
+        for duration in constants.DURATIONS_ALL:
+            cls = factory_candle_class(self.symbol, duration)
+            if is_partitioned(cls.__tablename__):
+                ensure_partitions(cls.__tablename__, until)
+
+            cutoff = self.cutoff(duration, now)
+            if cutoff is None:
+                continue
+            if duration == constants.DURATION_1M:
+                self.compact(cls, cutoff)
+            report[duration] = self.prune(cls, cutoff)
+            logger.info(f'action=retention duration={duration} cutoff={cutoff} removed={report[duration]}')
+        return report
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f'action=retention error={e}')
+
+    def start(self, interval=24 * 60 * 60):
+        threading.Thread(target=self._run, args=(interval,), name='retention', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
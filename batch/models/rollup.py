@@ -0,0 +1,223 @@
+import datetime
+import logging
+import time
+
+import numpy as np
+
+from models.candle import factory_candle_class
+from utils.prometheus import Histogram
+
+from config import constants
+
+logger = logging.getLogger(__name__)
+FLUSH_LATENCY = Histogram('agm_candle_flush_seconds', 'Latency of writing the 1m bar being built')
+
+
+def truncate_time(time: datetime.datetime, duration: str) -> datetime.datetime:
+    minutes = constants.DURATION_SECONDS[duration] // 60
+    return time.replace(minute=time.minute - time.minute % minutes, second=0, microsecond=0)
+
+
+def reduce_volumes(volumes, starts):
+    # minutes without a volume (ticker mode) are skipped; a bucket without any stays NaN
+    known = ~np.isnan(volumes)
+    sums = np.add.reduceat(np.where(known, volumes, 0.0), starts)
+    return np.where(np.logical_or.reduceat(known, starts), sums, np.nan)
+
+
+def resample(times, opens, closes, highs, lows, volumes, duration: str):
+    seconds = constants.DURATION_SECONDS[duration]
+    times = np.asarray(times, dtype='datetime64[s]')
+    if len(times) == 0:
+        empty = np.array([], dtype=np.float64)
+        return times, empty, empty, empty, empty, empty
+
+    buckets = times.astype(np.int64) // seconds
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+    return (
+        (buckets[starts] * seconds).astype('datetime64[s]'),
+        np.asarray(opens, dtype=np.float64)[starts],
+        np.asarray(closes, dtype=np.float64)[ends],
+        np.maximum.reduceat(np.asarray(highs, dtype=np.float64), starts),
+        np.minimum.reduceat(np.asarray(lows, dtype=np.float64), starts),
+        reduce_volumes(np.asarray(volumes, dtype=np.float64), starts),
+    )
+
+
+def rebuild_candles(symbol, duration, start=None, end=None):
+    if duration == constants.DURATION_1M:
+        return 0
+
+    source_cls = factory_candle_class(symbol, constants.DURATION_1M)
+    cls = factory_candle_class(symbol, duration)
+    if start is not None:
+        start = truncate_time(start, duration)
+    rows = source_cls.get_rows_between(start, end)
+    if not rows:
+        return 0
+
+    times, opens, closes, highs, lows, volumes = zip(*rows)
+    volumes = [np.nan if v is None else v for v in volumes]
+    times, opens, closes, highs, lows, volumes = resample(
+        times, opens, closes, highs, lows, volumes, duration)
+    candles = [{
+        'time': t.astype(datetime.datetime),
+        'open': float(o),
+        'close': float(c),
+        'high': float(h),
+        'low': float(l),
+        'volume': None if np.isnan(v) else float(v),
+    } for t, o, c, h, l, v in zip(times, opens, closes, highs, lows, volumes)]
+
+    if start is None:
+        start = candles[0]['time']
+    if end is None:
+        end = candles[-1]['time'] + datetime.timedelta(
+            seconds=constants.DURATION_SECONDS[duration])
+    count = cls.replace_between(start, end, candles)
+    logger.info(f'action=rebuild_candles duration={duration} count={count}')
+    return count
+
+
+def minute_from_timestamp(timestamp):
+    minute = datetime.datetime.strptime(timestamp[:16], '%Y-%m-%dT%H:%M')
+    return minute + datetime.timedelta(hours=constants.DIFF_JST_FROM_UTC)
+
+
+class CandleRollup(object):
+    def __init__(self, symbol, durations, flush_interval=1.0):
+        self.symbol = symbol
+        self.durations = [d for d in durations if d != constants.DURATION_1M]
+        self.source_cls = factory_candle_class(symbol, constants.DURATION_1M)
+        self.flush_interval = flush_interval
+        self.current_minute = None
+        self.minute_key = None
+        # open, close, high, low, volume of the 1m bar being built; the volume
+        # stays None until a trade arrives since tickers only carry the 24h volume
+        self.bar = None
+        self.last_flush = 0.0
+        self.dropped = 0
+        # duration -> (time, open, close, high, low, volume) of the last closed candle
+        self.closed_candles = {}
+
+    def on_tick(self, ticker):
+        return self.on_price(ticker.timestamp, ticker.last)
+
+    def on_trade(self, trade):
+        return self.on_price(trade['timestamp'], float(trade['price']), size=float(trade['size']))
+
+    def on_price(self, timestamp, price, size=None):
+        closed = []
+        key = timestamp[:16]
+        if key != self.minute_key:
+            if self.minute_key is not None and key < self.minute_key:
+                self.dropped += 1
+                return closed
+            closed = self.start_bar(key, price)
+
+        bar = self.bar
+        if price > bar[2]:
+            bar[2] = price
+        if price < bar[3]:
+            bar[3] = price
+        bar[1] = price
+        if size is not None:
+            bar[4] = size if bar[4] is None else bar[4] + size
+
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+        return closed
+
+    def start_bar(self, key, price):
+        closed = []
+        minute = minute_from_timestamp(key)
+        if self.bar is not None:
+            self.flush()
+            closed = self.rollup(self.current_minute, minute)
+            self.bar = [price, price, price, price, None]
+        else:
+            # resume a bar that was partly written before a restart
+            candle = self.source_cls.get(minute)
+            if candle is None:
+                self.bar = [price, price, price, price, None]
+            else:
+                self.bar = [candle.open, candle.close, candle.high, candle.low, candle.volume]
+        self.minute_key = key
+        self.current_minute = minute
+        return closed
+
+    def flush(self):
+        if self.bar is None:
+            return
+        open, close, high, low, volume = self.bar
+        with FLUSH_LATENCY.time():
+            self.source_cls.upsert(self.current_minute, open, close, high, low, volume)
+        self.last_flush = time.monotonic()
+
+    def rollup(self, closed_minute, now_minute):
+        closed = [constants.DURATION_1M]
+        self.closed_candles[constants.DURATION_1M] = (closed_minute, *self.bar)
+        if not self.durations:
+            return closed
+
+        starts = {d: truncate_time(closed_minute, d) for d in self.durations}
+        rows = self.source_cls.get_rows_between(min(starts.values()), now_minute)
+        for duration in self.durations:
+            bucket = [r for r in rows if r.time >= starts[duration]]
+            if not bucket:
+                continue
+            volumes = [r.volume for r in bucket if r.volume is not None]
+            candle = (
+                starts[duration],
+                bucket[0].open,
+                bucket[-1].close,
+                max(r.high for r in bucket),
+                min(r.low for r in bucket),
+                sum(volumes) if volumes else None)
+            factory_candle_class(self.symbol, duration).upsert(*candle)
+
+            end = starts[duration] + datetime.timedelta(
+                seconds=constants.DURATION_SECONDS[duration])
+            if now_minute >= end:
+                closed.append(duration)
+                self.closed_candles[duration] = candle
+        return closed
+
+
+def benchmark(trades_per_second=1000, minutes=6, durations=constants.DURATIONS_ALL, symbol=constants.SYMBOL_BTC):
+    # replays a burst of GMO trade messages through CandleRollup, database writes included
+    source_cls = factory_candle_class(symbol, constants.DURATION_1M)
+    if source_cls.get_oldest_time() is not None:
+        raise RuntimeError('the rollup benchmark writes year-2000 candles; run it against an empty database')
+
+    count = trades_per_second * 60 * minutes
+    rng = np.random.default_rng(0)
+    start = datetime.datetime(2000, 1, 1)
+    offsets = np.sort(rng.integers(0, minutes * 60 * 1000, count))
+    prices = 3000000 + np.cumsum(rng.normal(0, 100, count))
+    messages = [{'timestamp': (start + datetime.timedelta(milliseconds=int(offset))).strftime(
+                     '%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z',
+                 'price': f'{price:.0f}', 'size': '0.01', 'side': 'BUY'}
+                for offset, price in zip(offsets.tolist(), prices.tolist())]
+
+    rollup = CandleRollup(symbol, durations)
+    closed = 0
+    begin = time.perf_counter()
+    try:
+        for message in messages:
+            closed += len(rollup.on_trade(message))
+        rollup.flush()
+        elapsed = time.perf_counter() - begin
+    finally:
+        end = start + datetime.timedelta(days=1)
+        for duration in durations:
+            factory_candle_class(symbol, duration).delete_between(start, end)
+    return {
+        'trades': count,
+        'seconds': elapsed,
+        'trades_per_second': count / elapsed,
+        'per_trade_us': elapsed / count * 1e6,
+        'closed_candles': closed,
+        'dropped': rollup.dropped,
+    }
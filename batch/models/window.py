@@ -0,0 +1,139 @@
+from collections import namedtuple
+import datetime
+import logging
+import threading
+
+import numpy as np
+
+from models.candle import factory_candle_class
+from models.rollup import truncate_time
+from utils.prometheus import Counter
+from utils.utils import jst_now
+
+from config import constants
+
+logger = logging.getLogger(__name__)
+WINDOW_RELOADS = Counter('agm_candle_window_reloads_total', 'Rolling candle windows reloaded from storage')
+
+WindowCandle = namedtuple('WindowCandle', ('time', 'open', 'close', 'high', 'low', 'volume'))
+FIELDS = WindowCandle._fields
+
+
+class CandleColumns(object):
+    # read-only candle sequence over numpy columns; a row is only built when it is indexed
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns['time'])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return CandleColumns({name: values[index] for name, values in self.columns.items()})
+        columns = self.columns
+        return WindowCandle(columns['time'][index].astype(datetime.datetime), float(columns['open'][index]),
+                            float(columns['close'][index]), float(columns['high'][index]),
+                            float(columns['low'][index]), float(columns['volume'][index]))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class CandleWindow(object):
+    # fixed-capacity window of closed candles; every field is stored twice so the
+    # latest `capacity` rows are always a contiguous slice, as in CandleRing
+    def __init__(self, capacity, step_seconds):
+        self.capacity = capacity
+        self.step = np.timedelta64(step_seconds, 's')
+        self.count = 0
+        self.fields = {
+            name: np.zeros(2 * capacity, dtype='datetime64[s]' if name == 'time' else np.float64)
+            for name in FIELDS}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def last_time(self):
+        if self.count == 0:
+            return None
+        return self.fields['time'][(self.count - 1) % self.capacity]
+
+    def _write(self, values):
+        index = self.count % self.capacity
+        for name, value in zip(FIELDS, values):
+            field = self.fields[name]
+            field[index] = value
+            field[index + self.capacity] = value
+        self.count += 1
+
+    def seed(self, rows):
+        with self.lock:
+            self.count = 0
+            for row in rows[-self.capacity:]:
+                self._write((np.datetime64(row[0], 's'), row[1], row[2], row[3], row[4], row[5] or 0.0))
+
+    def append(self, time, open, close, high, low, volume):
+        # false when the candle does not directly follow the last one
+        time = np.datetime64(time, 's')
+        with self.lock:
+            last = self.last_time
+            if last is not None and time == last:
+                # the same candle closed again, e.g. after a late trade; keep the newest values
+                self.count -= 1
+            elif last is not None and time != last + self.step:
+                return False
+            self._write((time, open, close, high, low, volume or 0.0))
+        return True
+
+    def arrays(self, n=None):
+        with self.lock:
+            n = min(self.capacity if n is None else n, len(self))
+            end = self.count % self.capacity + self.capacity
+            return {name: field[end - n:end].copy() for name, field in self.fields.items()}
+
+    def candles(self, n=None):
+        data = self.arrays(n)
+        return [WindowCandle(*row) for row in zip(
+            data['time'].astype(object), data['open'].tolist(), data['close'].tolist(),
+            data['high'].tolist(), data['low'].tolist(), data['volume'].tolist())]
+
+
+class RollingCandles(object):
+    # a CandleWindow seeded from storage once and then fed from candle-close events
+    def __init__(self, symbol, duration, capacity):
+        self.candle_cls = factory_candle_class(symbol, duration)
+        self.duration = duration
+        self.step = datetime.timedelta(seconds=constants.DURATION_SECONDS[duration])
+        self.window = CandleWindow(capacity, constants.DURATION_SECONDS[duration])
+        self.stale = True
+        self.reloads = 0
+
+    def reload(self, open_time=None):
+        # rows from open_time on belong to a candle that is still being built
+        if open_time is None:
+            open_time = truncate_time(jst_now(), self.duration)
+        rows = self.candle_cls.get_latest_rows(self.window.capacity + 1)
+        while rows and rows[-1].time >= open_time:
+            rows = rows[:-1]
+        self.window.seed(rows)
+        self.stale = False
+        self.reloads += 1
+        WINDOW_RELOADS.inc()
+
+    def invalidate(self):
+        self.stale = True
+
+    def update(self, candle):
+        # the candle has closed, so everything up to and including it is final
+        if self.stale:
+            self.reload(candle[0] + self.step)
+        elif not self.window.append(*candle):
+            logger.info(f'action=rolling_candles status=diverged last={self.window.last_time} time={candle[0]}')
+            self.reload(candle[0] + self.step)
+
+    def candles(self, n=None):
+        if self.stale:
+            self.reload()
+        return self.window.candles(n)
@@ -0,0 +1,123 @@
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import logging
+import time
+
+import numpy as np
+
+from models.candle import factory_candle_class
+from models.rollup import truncate_time
+from services.gmo_api import ApiClient
+from utils.utils import jst_now
+
+from config import settings, constants
+
+logger = logging.getLogger(__name__)
+
+# GMO switches the daily kline file at 06:00 JST
+KLINE_DAY_OFFSET = datetime.timedelta(hours=6)
+BATCH_SIZE = 1000
+
+
+def find_gaps(cls, duration, start, end):
+    step = np.timedelta64(constants.DURATION_SECONDS[duration], 's')
+    times = np.array(cls.get_times_between(start, end), dtype='datetime64[s]')
+    bounds = np.concatenate((
+        np.array([np.datetime64(start, 's') - step]),
+        times,
+        np.array([np.datetime64(end, 's')])))
+    missing = np.flatnonzero(np.diff(bounds) > step)
+    return [((bounds[i] + step).astype(datetime.datetime), bounds[i + 1].astype(datetime.datetime))
+            for i in missing]
+
+
+def kline_dates(gaps, duration):
+    step = datetime.timedelta(seconds=constants.DURATION_SECONDS[duration])
+    dates = set()
+    for gap_start, gap_end in gaps:
+        day = (gap_start - KLINE_DAY_OFFSET).date()
+        last_day = (gap_end - step - KLINE_DAY_OFFSET).date()
+        while day <= last_day:
+            dates.add(day.strftime('%Y%m%d'))
+            day += datetime.timedelta(days=1)
+    return sorted(dates)
+
+
+def kline_to_row(kline):
+    time = datetime.datetime.utcfromtimestamp(int(kline['openTime']) / 1000)
+    return {
+        'time': time + datetime.timedelta(hours=constants.DIFF_JST_FROM_UTC),
+        'open': float(kline['open']),
+        'close': float(kline['close']),
+        'high': float(kline['high']),
+        'low': float(kline['low']),
+        'volume': float(kline['volume']),
+    }
+
+
+def in_gaps(time, gaps):
+    for gap_start, gap_end in gaps:
+        if gap_start <= time < gap_end:
+            return True
+    return False
+
+
+class Backfill(object):
+    def __init__(self, symbol=settings.symbol, durations=None, api=None, workers=4):
+        self.symbol = symbol
+        self.durations = durations or settings.durations
+        self.api = api or ApiClient()
+        self.workers = workers
+
+    def fetch_day(self, duration, date):
+        try:
+            return self.api.get_klines(duration, date, symbol=self.symbol)
+        except Exception as e:
+            logger.error(f'action=fetch_day duration={duration} date={date} error={e}')
+            return []
+
+    def fill_duration(self, duration, periods, now=None):
+        step = datetime.timedelta(seconds=constants.DURATION_SECONDS[duration])
+        end = truncate_time(now or jst_now(), duration)
+        return self.fill_range(duration, end - step * periods, end)
+
+    def fill_range(self, duration, start, end):
+        cls = factory_candle_class(self.symbol, duration)
+        gaps = find_gaps(cls, duration, start, end)
+        if not gaps:
+            return 0, 0
+
+        dates = kline_dates(gaps, duration)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            days = list(executor.map(lambda d: self.fetch_day(duration, d), dates))
+
+        rows = [kline_to_row(k) for day in days for k in day]
+        rows = [row for row in rows if in_gaps(row['time'], gaps)]
+        filled = 0
+        for i in range(0, len(rows), BATCH_SIZE):
+            filled += cls.bulk_upsert(rows[i:i + BATCH_SIZE])
+        return len(gaps), filled
+
+    def warm_start(self, periods, now=None):
+        start = time.monotonic()
+        report = {}
+        for duration in self.durations:
+            gaps, filled = self.fill_duration(duration, periods, now)
+            report[duration] = {'gaps': gaps, 'filled': filled}
+            logger.info(f'action=warm_start duration={duration} gaps={gaps} filled={filled}')
+        report['elapsed'] = time.monotonic() - start
+        logger.info(f'action=warm_start status=done elapsed={report["elapsed"]:.3f}')
+        return report
+
+    def repair(self, start, end):
+        # called after a feed outage; only closed candles can be repaired from klines
+        report = {}
+        for duration in self.durations:
+            stop = truncate_time(end, duration)
+            begin = truncate_time(start, duration)
+            if begin >= stop:
+                continue
+            gaps, filled = self.fill_range(duration, begin, stop)
+            report[duration] = {'gaps': gaps, 'filled': filled}
+            logger.info(f'action=repair duration={duration} start={begin} end={stop} gaps={gaps} filled={filled}')
+        return report
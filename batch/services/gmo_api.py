@@ -1,4 +1,6 @@
 from bs4 import BeautifulSoup
+from collections import OrderedDict
+from collections import deque
 import json
 from json import JSONDecodeError
 import hashlib
@@ -6,18 +8,48 @@ import hmac
 import time
 import logging
 import math
+import random
+import threading
 import websocket
 from datetime import datetime, timedelta
 
 import requests
 from requests.exceptions import RequestException
 
+from services.ratelimit import REMOTE_THROTTLED
+from services.ratelimit import RequestScheduler
+from services.ratelimit import TtlCache
+
 from config import settings, constants
+from utils.prometheus import Counter
+from utils.prometheus import Histogram
 
 logger = logging.getLogger(__name__)
+WS_CONNECTS = Counter('agm_websocket_connects_total', 'Public websocket connections opened')
+WS_RECONNECTS = Counter('agm_websocket_reconnects_total', 'Public websocket reconnections')
+WS_DISCONNECTED = Counter('agm_websocket_disconnected_seconds_total', 'Time the public websocket spent disconnected')
+WS_STALLS = Counter('agm_websocket_stalls_total', 'Public websocket connections closed for going silent')
+WS_GAPS = Counter('agm_websocket_gap_minutes_total', 'Minutes without ticks flagged for candle repair')
+ORDER_LATENCY = Histogram('agm_order_api_seconds', 'Latency of order API calls')
+
+# shared by every ApiClient in the process since the exchange limits per account
+SCHEDULER = RequestScheduler(
+    get_rate=getattr(settings, 'api_get_rate', 20), post_rate=getattr(settings, 'api_post_rate', 20))
+ACCOUNT_CACHE = TtlCache(getattr(settings, 'account_cache_ttl', 1.0))
+RATE_LIMIT_ERROR = 'ERR-5003'
 
 public_end_point = 'https://api.coin.z.com/public'
+public_ws_end_point = 'wss://api.coin.z.com/ws/public/v1'
 private_end_point = 'https://api.coin.z.com/private'
+private_ws_end_point = 'wss://api.coin.z.com/ws/private/v1'
+
+kline_intervals = {
+    constants.DURATION_1M: '1min',
+    constants.DURATION_5M: '5min',
+    constants.DURATION_15M: '15min',
+    constants.DURATION_30M: '30min',
+    constants.DURATION_1H: '1hour',
+}
 
 
 class Ticker(object):
@@ -72,38 +104,150 @@ class Ticker(object):
         return datetime.strptime(ticker_time, time_format)
 
 
+def minutes_between(previous, current):
+    # both are 'YYYY-MM-DDTHH:MM' prefixes of exchange timestamps
+    delta = datetime.strptime(current, '%Y-%m-%dT%H:%M') - datetime.strptime(previous, '%Y-%m-%dT%H:%M')
+    return int(delta.total_seconds() // 60)
+
+
+def timestamp_minute(message):
+    index = message.find('"timestamp"')
+    if index < 0:
+        return None
+    index = message.find('"', index + 11)
+    return message[index + 1:index + 17]
+
+
 class PublicWebSocketApi(object):
-    def __init__(self):
-        websocket.enableTrace(True)
-        self.ws_path = 'wss://api.coin.z.com/ws/public/v1'
+    def __init__(self, channels=('ticker',), ws_path=public_ws_end_point, on_gap=None,
+                 ping_interval=30, ping_timeout=10, stall_timeout=60,
+                 backoff_base=1.0, backoff_max=60.0, trace=None, max_gaps=100):
+        websocket.enableTrace(getattr(settings, 'websocket_trace', False) if trace is None else trace)
+        self.ws_path = ws_path
+        self.channels = channels
+        self.on_gap = on_gap
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.stall_timeout = stall_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.wsapp = None
+        self.last_message = None
+        self.last_minute = None
+        self.disconnected_at = None
+        self.disconnected_time = 0.0
+        # the latest flagged gaps, for inspection; repairs go through on_gap
+        self.gaps = deque(maxlen=max_gaps)
+        self._stop = threading.Event()
 
-    @staticmethod
-    def on_open(ws):
-        message = {
-            "command": "subscribe",
-            "channel": "ticker",
-            "symbol": settings.symbol
-        }
-        ws.send(json.dumps(message))
+    def on_open(self, ws):
+        if WS_CONNECTS.value > 0:
+            WS_RECONNECTS.inc()
+        WS_CONNECTS.inc()
+        if self.disconnected_at is not None:
+            down = time.monotonic() - self.disconnected_at
+            self.disconnected_time += down
+            WS_DISCONNECTED.inc(down)
+            self.disconnected_at = None
+        self.last_message = time.monotonic()
+        for i, channel in enumerate(self.channels):
+            # GMO accepts one subscribe command per second
+            if i > 0:
+                time.sleep(1)
+            message = {
+                "command": "subscribe",
+                "channel": channel,
+                "symbol": settings.symbol
+            }
+            ws.send(json.dumps(message))
 
     @staticmethod
     def on_message(ws, message):
-        print(message)
-        # ws.close()
+        logger.debug(f'action=on_message message={message}')
+
+    def track(self, message):
+        self.last_message = time.monotonic()
+        minute = timestamp_minute(message)
+        if minute is None or minute == self.last_minute:
+            return
+        previous, self.last_minute = self.last_minute, minute
+        if previous is None or minute < previous:
+            return
+        missing = minutes_between(previous, minute) - 1
+        if missing > 0:
+            self.flag_gap(previous, minute, missing)
+
+    def flag_gap(self, previous, current, missing):
+        # minutes strictly between the two ticks have no data and need a repair
+        start = datetime.strptime(previous, '%Y-%m-%dT%H:%M') + timedelta(
+            minutes=1, hours=constants.DIFF_JST_FROM_UTC)
+        end = datetime.strptime(current, '%Y-%m-%dT%H:%M') + timedelta(hours=constants.DIFF_JST_FROM_UTC)
+        self.gaps.append((start, end))
+        WS_GAPS.inc(missing)
+        logger.warning(f'action=websocket_gap start={start} end={end} missing={missing}')
+        if self.on_gap is not None:
+            self.on_gap(start, end)
+
+    def backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return random.uniform(delay / 2, delay)
+
+    def _watch(self):
+        while not self._stop.wait(min(1.0, self.stall_timeout / 4)):
+            last = self.last_message
+            if self.wsapp is None or last is None:
+                continue
+            if time.monotonic() - last > self.stall_timeout:
+                WS_STALLS.inc()
+                logger.warning(f'action=websocket_stall silent={time.monotonic() - last:.1f}')
+                self.last_message = None
+                self.wsapp.close()
 
     def get_real_time_ticker(self, on_message=None):
         if on_message is None:
             on_message = self.on_message
 
-        wsapp = websocket.WebSocketApp(
-            self.ws_path, on_open=self.on_open, on_message=on_message)
-        wsapp.run_forever()
+        def handle(ws, message):
+            self.track(message)
+            on_message(ws, message)
+
+        threading.Thread(target=self._watch, name='public_ws_watchdog', daemon=True).start()
+        attempt = 0
+        while not self._stop.is_set():
+            connects = WS_CONNECTS.value
+            try:
+                self.wsapp = websocket.WebSocketApp(
+                    self.ws_path, on_open=self.on_open, on_message=handle)
+                self.wsapp.run_forever(ping_interval=self.ping_interval, ping_timeout=self.ping_timeout)
+            except Exception as e:
+                logger.error(f'action=public_websocket error={e}')
+            if self._stop.is_set():
+                break
+            if self.disconnected_at is None:
+                self.disconnected_at = time.monotonic()
+            attempt = 0 if WS_CONNECTS.value > connects else attempt + 1
+            delay = self.backoff(attempt)
+            logger.warning(f'action=public_websocket status=reconnecting attempt={attempt} delay={delay:.2f}')
+            self._stop.wait(delay)
+
+    def stop(self):
+        self._stop.set()
+        if self.wsapp is not None:
+            self.wsapp.close()
+
+
+def is_rate_limited(resp):
+    return any(m.get('message_code') == RATE_LIMIT_ERROR for m in resp.get('messages', []))
 
 
 class ApiClient(object):
-    def __init__(self, api_key=settings.api_key, secret_key=settings.secret_key):
+    def __init__(self, api_key=settings.api_key, secret_key=settings.secret_key,
+                 public_url=public_end_point, scheduler=SCHEDULER, cache=ACCOUNT_CACHE):
         self.api_key = api_key
         self.secret_key = secret_key
+        self.public_url = public_url
+        self.scheduler = scheduler
+        self.cache = cache
 
     @staticmethod
     def get_ticker():
@@ -115,7 +259,22 @@ class ApiClient(object):
             raise
         return eval(json.dumps(resp.json()))['data'][0]
 
+    def get_klines(self, duration, date, symbol=settings.symbol):
+        url = self.public_url + '/v1/klines'
+        params = {
+            'symbol': symbol,
+            'interval': kline_intervals[duration],
+            'date': date,
+        }
+        try:
+            resp = requests.get(url, params=params, timeout=10)
+            return resp.json()['data']
+        except RequestException as e:
+            logger.error(f'action=get_klines params={params} error={e}')
+            raise
+
     def call_private_get_api(self, path, params=None):
+        self.scheduler.acquire('GET')
         timestamp = '{0}000'.format(
             int(time.mktime(datetime.now().timetuple()))
         )
@@ -130,15 +289,18 @@ class ApiClient(object):
             'API-SIGN': sign,
         }
         try:
-            resp = requests.get(url, headers=headers, params=params)
-            return eval(json.dumps(resp.json()))
+            resp = eval(json.dumps(requests.get(url, headers=headers, params=params).json()))
         except RequestException as e:
             logger.error(f'action=call_private_get_api params={params} error={e}')
             raise
+        if is_rate_limited(resp):
+            REMOTE_THROTTLED.inc()
+            logger.warning(f'action=call_private_get_api path={path} error=rate_limited')
+        return resp
 
     def get_available_amount(self):
         path = '/v1/account/margin'
-        return self.call_private_get_api(path)
+        return self.cache.get(path, lambda: self.call_private_get_api(path))
 
     def get_contract_last_day(self):
         path = '/v1/latestExecutions'
@@ -147,14 +309,15 @@ class ApiClient(object):
             'page': 1,
             'count': 100,
         }
-        return self.call_private_get_api(path, params)
+        return self.cache.get(path, lambda: self.call_private_get_api(path, params))
 
     def get_open_interest(self):
         path = '/v1/positionSummary'
         params = {'symbol': settings.symbol}
-        return self.call_private_get_api(path, params)
+        return self.cache.get(path, lambda: self.call_private_get_api(path, params))
 
     def call_private_post_api(self, path, data):
+        self.scheduler.acquire('POST')
         timestamp = '{0}000'.format(
             int(time.mktime(datetime.now().timetuple()))
         )
@@ -170,7 +333,7 @@ class ApiClient(object):
         }
         try:
             resp = requests.post(url, headers=headers, data=json.dumps(data))
-            return eval(json.dumps(resp.json()))
+            result = eval(json.dumps(resp.json()))
         except RequestException as e:
             logger.error(f'action=call_private_post_api data={data} error={e}')
             raise
@@ -179,6 +342,39 @@ class ApiClient(object):
             error = soup.text.replace('\n', '')
             logger.error(f'action=call_private_post_api error={error}')
             raise
+        if is_rate_limited(result):
+            REMOTE_THROTTLED.inc()
+            logger.warning(f'action=call_private_post_api path={path} error=rate_limited')
+        return result
+
+    def call_private_put_api(self, path, data):
+        self.scheduler.acquire('PUT')
+        timestamp = '{0}000'.format(
+            int(time.mktime(datetime.now().timetuple()))
+        )
+        method = 'PUT'
+        url = private_end_point + path
+        text = timestamp + method + path + json.dumps(data)
+        sign = hmac.new(bytes(self.secret_key.encode('ascii')),
+                        bytes(text.encode('ascii')), hashlib.sha256).hexdigest()
+        headers = {
+            'API-KEY': self.api_key,
+            'API-TIMESTAMP': timestamp,
+            'API-SIGN': sign,
+        }
+        try:
+            resp = requests.put(url, headers=headers, data=json.dumps(data))
+            return resp.json()
+        except RequestException as e:
+            logger.error(f'action=call_private_put_api data={data} error={e}')
+            raise
+
+    def get_ws_token(self):
+        resp = self.call_private_post_api('/v1/ws-auth', {})
+        return resp['data']
+
+    def extend_ws_token(self, token):
+        return self.call_private_put_api('/v1/ws-auth', {'token': token})
 
     def order(self, side):
         path = '/v1/order'
@@ -191,8 +387,14 @@ class ApiClient(object):
             # 'losscutPrice': settings.loss_cut_price,
             'size': settings.size,
         }
-        resp = self.call_private_post_api(path, data)
+        try:
+            with ORDER_LATENCY.time():
+                resp = self.call_private_post_api(path, data)
+        finally:
+            # margin, positions and executions all change with our own orders
+            self.cache.invalidate()
         logger.info(f'action=order side={side} resp={resp}')
+        return resp
 
     def pay_all_order(self, side):
         path = '/v1/closeBulkOrder'
@@ -204,5 +406,104 @@ class ApiClient(object):
             # 'price': settings.price,
             'size': settings.size,
         }
-        resp = self.call_private_post_api(path, data)
+        try:
+            resp = self.call_private_post_api(path, data)
+        finally:
+            self.cache.invalidate()
         logger.info(f'action=pay_all_order resp={resp}')
+
+
+class PrivateWebSocketApi(object):
+    def __init__(self, api=None, ws_path=private_ws_end_point, extend_interval=30 * 60,
+                 max_age=5 * 60, max_orders=1000):
+        self.api = api or ApiClient()
+        self.ws_path = ws_path
+        self.extend_interval = extend_interval
+        self.token = None
+        self.fills = {}
+        self.completed = set()
+        # order id -> monotonic time of its last event, oldest first; orders nobody
+        # waits on, e.g. manual ones, are dropped once too old or too many
+        self.updated = OrderedDict()
+        self.max_age = max_age
+        self.max_orders = max_orders
+        self.cond = threading.Condition()
+        self.wsapp = None
+        self._stop = threading.Event()
+
+    def on_open(self, ws):
+        for channel in ('executionEvents', 'orderEvents'):
+            ws.send(json.dumps({'command': 'subscribe', 'channel': channel}))
+
+    def on_message(self, ws, message):
+        event = json.loads(message)
+        order_id = str(event.get('orderId', ''))
+        if not order_id:
+            return
+
+        with self.cond:
+            self.touch(order_id)
+            if event.get('channel') == 'executionEvents':
+                self.fills.setdefault(order_id, []).append(
+                    (float(event['executionPrice']), float(event['executionSize'])))
+                if float(event.get('orderExecutedSize', 0)) >= float(event.get('orderSize', 0)):
+                    self.completed.add(order_id)
+            elif event.get('orderStatus') in ('EXECUTED', 'CANCELED', 'EXPIRED'):
+                self.completed.add(order_id)
+            self.cond.notify_all()
+
+    def touch(self, order_id):
+        now = time.monotonic()
+        self.updated[order_id] = now
+        self.updated.move_to_end(order_id)
+        while self.updated:
+            oldest, updated_at = next(iter(self.updated.items()))
+            if now - updated_at <= self.max_age and len(self.updated) <= self.max_orders:
+                break
+            self.forget(oldest)
+
+    def forget(self, order_id):
+        self.updated.pop(order_id, None)
+        self.completed.discard(order_id)
+        return self.fills.pop(order_id, [])
+
+    def wait_fills(self, order_id, timeout):
+        order_id = str(order_id)
+        with self.cond:
+            self.cond.wait_for(lambda: order_id in self.completed, timeout)
+            return self.forget(order_id)
+
+    def wait_price(self, order_id, timeout):
+        fills = self.wait_fills(order_id, timeout)
+        size = sum(s for _, s in fills)
+        if size == 0:
+            return None
+        return sum(p * s for p, s in fills) / size
+
+    def _extend_token(self):
+        while not self._stop.wait(self.extend_interval):
+            try:
+                self.api.extend_ws_token(self.token)
+            except Exception as e:
+                logger.error(f'action=extend_ws_token error={e}')
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.token = self.api.get_ws_token()
+                self.wsapp = websocket.WebSocketApp(
+                    f'{self.ws_path}/{self.token}',
+                    on_open=self.on_open, on_message=self.on_message)
+                self.wsapp.run_forever()
+            except Exception as e:
+                logger.error(f'action=private_websocket error={e}')
+            self._stop.wait(1)
+
+    def start(self):
+        threading.Thread(target=self._run, name='private_ws', daemon=True).start()
+        threading.Thread(target=self._extend_token, name='private_ws_token', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        if self.wsapp is not None:
+            self.wsapp.close()
@@ -0,0 +1,192 @@
+import datetime
+import json
+import logging
+import math
+import threading
+import time
+
+import numpy as np
+
+from services.gmo_api import PublicWebSocketApi
+from services.gmo_api import Ticker
+from services.wsserver import LocalWebSocketServer
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PricePath(object):
+    # a slow swing plus noise so indicators cross often and the AI keeps trading
+    def __init__(self, base=3000000.0, amplitude=0.01, period=400, noise=0.0005, seed=0):
+        self.base = base
+        self.amplitude = amplitude
+        self.period = period
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+        self.step = 0
+
+    def next(self):
+        swing = math.sin(2 * math.pi * self.step / self.period)
+        self.step += 1
+        return self.base * (1 + self.amplitude * swing + self.noise * self.rng.standard_normal())
+
+
+class TickerStream(object):
+    # GMO ticker messages on a simulated clock that closes a 1m candle every `ticks_per_candle` ticks
+    def __init__(self, symbol=settings.symbol, ticks_per_candle=50, start=None, seed=0):
+        self.symbol = symbol
+        self.tick = datetime.timedelta(seconds=60 / ticks_per_candle)
+        self.time = start or datetime.datetime(2000, 1, 1)
+        self.path = PricePath(seed=seed)
+        self.volume = 0.0
+
+    def next(self, sent):
+        price = self.path.next()
+        self.time += self.tick
+        self.volume += 0.01
+        return json.dumps({
+            'channel': 'ticker',
+            'ask': f'{price + 500:.0f}',
+            'bid': f'{price - 500:.0f}',
+            'high': f'{price * 1.02:.0f}',
+            'last': f'{price:.0f}',
+            'low': f'{price * 0.98:.0f}',
+            'symbol': self.symbol,
+            'timestamp': self.time.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z',
+            'volume': f'{self.volume:.4f}',
+            # not part of GMO's format; read back by the receiver to measure lag
+            'sent': sent,
+        }, separators=(',', ':'))
+
+
+def sent_time(message):
+    return float(message[message.rfind('"sent":') + 7:-1])
+
+
+def parse_target():
+    def handle(ws, message):
+        dic = json.loads(message)
+        Ticker(timestamp=dic['timestamp'], ask=dic['ask'], bid=dic['bid'], high=dic['high'],
+               last=dic['last'], low=dic['low'], volume=dic['volume'])
+    return handle, lambda: None
+
+
+def trade_target():
+    from models.candle import factory_candle_class
+    from services.trade import AiTrade
+    if not settings.back_test:
+        raise RuntimeError('the trade load target places orders unless back_test is on')
+    # the synthetic year-2000 candles must never land next to real ones
+    for duration in settings.durations:
+        if factory_candle_class(settings.symbol, duration).get_oldest_time() is not None:
+            raise RuntimeError(f'the trade load target needs an empty database, {duration} candles exist')
+    trade = AiTrade(backfill_on_start=False)
+    trade.trade_worker.start()
+    return trade.write_ticker_info, trade.trade_worker.stop
+
+
+TARGETS = {
+    'parse': parse_target,
+    'trade': trade_target,
+}
+
+
+class LoadGenerator(object):
+    def __init__(self, rates=(100, 200, 500, 1000, 2000), step_seconds=5.0, burst_factor=3.0,
+                 burst_every=2.0, burst_length=0.2, ticks_per_candle=50, growth_threshold=0.05, seed=0):
+        self.rates = rates
+        self.step_seconds = step_seconds
+        self.burst_factor = burst_factor
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.growth_threshold = growth_threshold
+        self.stream = TickerStream(ticks_per_candle=ticks_per_candle, seed=seed)
+        self.received = []
+        self.lock = threading.Lock()
+
+    def rate_at(self, rate, elapsed):
+        # short bursts on top of the base rate, like a fast market
+        if elapsed % self.burst_every < self.burst_length:
+            return rate * self.burst_factor
+        return rate
+
+    def measure(self, target):
+        def handle(ws, message):
+            target(ws, message)
+            now = time.time()
+            with self.lock:
+                self.received.append((now, now - sent_time(message)))
+        return handle
+
+    def send_level(self, server, rate):
+        start = time.time()
+        sent = 0
+        due = start
+        while True:
+            now = time.time()
+            elapsed = now - start
+            if elapsed >= self.step_seconds:
+                break
+            if now < due:
+                time.sleep(min(due - now, 0.001))
+                continue
+            server.broadcast(self.stream.next(time.time()))
+            sent += 1
+            due += 1.0 / self.rate_at(rate, elapsed)
+        return start, time.time(), sent
+
+    def summarize(self, rate, start, end, sent):
+        with self.lock:
+            rows = [r for r in self.received if start <= r[0] < end]
+        level = {'rate': rate, 'sent_per_second': sent / (end - start),
+                 'received_per_second': len(rows) / (end - start)}
+        if len(rows) < 2:
+            level.update({'lag_p50_ms': None, 'lag_p99_ms': None, 'lag_growth': None, 'falling_behind': True})
+            return level
+        times = np.array([r[0] for r in rows]) - start
+        lags = np.array([r[1] for r in rows])
+        # seconds of lag added per second of load; near zero while the consumer keeps up
+        growth = float(np.polyfit(times, lags, 1)[0])
+        level.update({
+            'lag_p50_ms': float(np.percentile(lags, 50) * 1e3),
+            'lag_p99_ms': float(np.percentile(lags, 99) * 1e3),
+            'lag_growth': growth,
+            'falling_behind': growth > self.growth_threshold,
+        })
+        return level
+
+    def run(self, target='parse', drain_seconds=5.0):
+        handler, stop = TARGETS[target]()
+        server = LocalWebSocketServer().start()
+        api = PublicWebSocketApi(ws_path=server.url, stall_timeout=max(60, drain_seconds * 2))
+        threading.Thread(target=api.get_real_time_ticker, args=(self.measure(handler),),
+                         name='load_consumer', daemon=True).start()
+        if not server.connected.wait(10):
+            raise RuntimeError('consumer did not connect to the load server')
+
+        levels = []
+        try:
+            for rate in self.rates:
+                start, end, sent = self.send_level(server, rate)
+                levels.append(self.summarize(rate, start, end, sent))
+                logger.info(f'action=load_level {levels[-1]}')
+            # let the consumer drain so the total lag is visible
+            deadline = time.time() + drain_seconds
+            total = sum(round(level['sent_per_second'] * self.step_seconds) for level in levels)
+            while time.time() < deadline and len(self.received) < total:
+                time.sleep(0.1)
+        finally:
+            api.stop()
+            server.stop()
+            stop()
+
+        keeping_up = [level for level in levels if not level['falling_behind']]
+        knee = next((level['rate'] for level in levels if level['falling_behind']), None)
+        return {
+            'target': target,
+            'levels': levels,
+            'sustained_per_second': max((level['received_per_second'] for level in keeping_up), default=0.0),
+            'lag_grows_from_rate': knee,
+            'final_lag_ms': self.received[-1][1] * 1e3 if self.received else None,
+        }
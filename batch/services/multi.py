@@ -0,0 +1,96 @@
+import logging
+
+from models.ai import AI
+from models.ai import duration_seconds
+from models.dfcandle import DataFrameCandle
+from models.params import sweep_key
+from models.window import RollingCandles
+from services.optimizer import OptimizeScheduler
+from services.trade import AiTrade
+from tradingalgo.indicators import IndicatorCache
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MultiStrategyTrade(AiTrade):
+    def __init__(self, strategies=None):
+        self.strategies = strategies or getattr(settings, 'strategies', [{}])
+        self.ais = []
+        self.window = None
+        self.optimizer = None
+        super().__init__()
+
+    @property
+    def past_period(self):
+        return max(s.get('past_period', settings.past_period) for s in self.strategies)
+
+    def create_ai(self):
+        # one window and one optimizer thread serve every strategy
+        self.window = RollingCandles(settings.symbol, settings.trade_duration, self.past_period)
+        self.optimizer = OptimizeScheduler(
+            self.update_optimize_params,
+            interval=getattr(settings, 'optimize_interval', 0),
+            timeout=getattr(settings, 'optimize_timeout', 0),
+            retry_interval=10 * duration_seconds(settings.trade_duration))
+        for strategy in self.strategies:
+            self.ais.append(AI(
+                symbol=settings.symbol,
+                use_percent=settings.use_percent,
+                duration=settings.trade_duration,
+                past_period=strategy.get('past_period', settings.past_period),
+                stop_limit_percent=strategy.get('stop_limit_percent', settings.stop_limit_percent),
+                back_test=True,
+                num_ranking=strategy.get('num_ranking', settings.num_ranking),
+                window=self.window,
+                optimizer=self.optimizer,
+                max_signals=1))
+
+        loaded = [ai.load_optimize_params() for ai in self.ais]
+        if all(loaded):
+            self.optimizer.start()
+            self.optimizer.request()
+        else:
+            self.optimizer.run_once()
+            self.optimizer.start()
+        return None
+
+    def update_optimize_params(self, deadline=None):
+        # the window is read once per sweep and strategies with the same settings share a result
+        candles = self.window.candles()
+        results = {}
+        for ai in self.ais:
+            key = (ai.past_period, sweep_key(ai.sweep_settings()))
+            if key in results:
+                if results[key] is not None:
+                    ai.optimized_trade_params = results[key]
+                continue
+            df = DataFrameCandle(settings.symbol, settings.trade_duration)
+            df.candles = candles[-ai.past_period:]
+            results[key] = ai.update_optimize_params(deadline, df)
+        if any(params is None for params in results.values()):
+            return None
+        return results
+
+    def trade_start(self):
+        for ai in self.ais:
+            ai.orderbook = self.orderbook
+        super().trade_start()
+
+    @property
+    def strategy_ais(self):
+        return self.ais
+
+    def _trade(self):
+        with self.trade_lock:
+            self.window.update(self.rollup.closed_candles[settings.trade_duration])
+            # the longest window serves every strategy
+            df = DataFrameCandle(settings.symbol, settings.trade_duration)
+            df.candles = self.window.candles()
+            indicators = IndicatorCache(df.closes)
+            for i, ai in enumerate(self.ais):
+                ai.trade(df, indicators)
+                logger.info(f'action=multi_trade strategy={i} profit={ai.signal_events.profit}')
+            logger.info(f'action=multi_trade indicators={len(indicators.values)} '
+                        f'hits={indicators.hits} misses={indicators.misses}')
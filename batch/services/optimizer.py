@@ -0,0 +1,64 @@
+import logging
+import threading
+import time
+
+from utils.prometheus import Histogram
+
+logger = logging.getLogger(__name__)
+OPTIMIZE_DURATION = Histogram('agm_optimize_seconds', 'Duration of optimizer runs')
+
+
+class OptimizeScheduler(object):
+    def __init__(self, optimize, interval=0, timeout=0, retry_interval=600):
+        self.optimize = optimize
+        self.interval = interval
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.last_params = None
+        self.last_duration = 0.0
+        self.run_count = 0
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='optimizer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def request(self):
+        self._wakeup.set()
+
+    def run_once(self):
+        start = time.monotonic()
+        deadline = start + self.timeout if self.timeout else None
+        try:
+            self.last_params = self.optimize(deadline)
+        except Exception as e:
+            logger.error(f'action=optimize_scheduler error={e}')
+            self.last_params = None
+        self.last_duration = time.monotonic() - start
+        OPTIMIZE_DURATION.observe(self.last_duration)
+        self.run_count += 1
+        logger.info(f'action=optimize_scheduler status=done duration={self.last_duration:.3f}')
+        return self.last_params
+
+    def _next_wait(self):
+        if self.last_params is None:
+            return self.retry_interval
+        if self.interval:
+            return self.interval
+        return None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self._next_wait())
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            self.run_once()
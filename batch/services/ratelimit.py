@@ -0,0 +1,88 @@
+import logging
+import threading
+import time
+
+from utils.prometheus import Counter
+from utils.prometheus import Histogram
+
+logger = logging.getLogger(__name__)
+THROTTLED = Counter('agm_api_throttled_total', 'API calls delayed by the client-side rate limiter')
+REMOTE_THROTTLED = Counter('agm_api_remote_throttled_total', 'API calls rejected by the exchange for exceeding the rate limit')
+QUEUE_WAIT = Histogram('agm_api_queue_wait_seconds', 'Time API calls wait for a rate limiter token')
+CACHE_HITS = Counter('agm_api_cache_hits_total', 'Account queries answered from the TTL cache')
+CACHE_MISSES = Counter('agm_api_cache_misses_total', 'Account queries sent to the exchange')
+
+
+class TokenBucket(object):
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        start = time.monotonic()
+        throttled = False
+        with self.cond:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    break
+                throttled = True
+                self.cond.wait((1 - self.tokens) / self.rate)
+            self.tokens -= 1
+        wait = time.monotonic() - start
+        QUEUE_WAIT.observe(wait)
+        if throttled:
+            THROTTLED.inc()
+            logger.debug(f'action=rate_limit wait={wait:.3f}')
+        return wait
+
+
+class RequestScheduler(object):
+    # GMO limits GET and POST requests separately, so an order only ever queues
+    # behind other orders and never behind account queries
+    def __init__(self, get_rate=20, post_rate=20):
+        self.buckets = {
+            'GET': TokenBucket(get_rate),
+            'POST': TokenBucket(post_rate),
+            'PUT': TokenBucket(post_rate),
+        }
+
+    def acquire(self, method):
+        return self.buckets[method].acquire()
+
+
+class TtlCache(object):
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.values = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, fetch):
+        with self.lock:
+            entry = self.values.get(key)
+            generation = self.generation
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            CACHE_HITS.inc()
+            return entry[1]
+        CACHE_MISSES.inc()
+        fetched_at = time.monotonic()
+        value = fetch()
+        with self.lock:
+            # an invalidation while fetching means the value may predate our own order
+            if generation == self.generation:
+                self.values[key] = (fetched_at, value)
+        return value
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            self.values.clear()
@@ -0,0 +1,175 @@
+import logging
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+import os
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('time', 'open', 'close', 'high', 'low', 'volume')
+HEADER = 4
+GENERATION, CAPACITY, COUNT, READY = 0, 1, 2, 3
+
+
+def ring_name(symbol, duration):
+    return f'agm_{symbol}_{duration}'
+
+
+def segment_size(capacity):
+    # every field is stored twice so the latest `capacity` rows are always contiguous
+    return 8 * (HEADER + len(FIELDS) * 2 * capacity)
+
+
+class CandleRing(object):
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((HEADER,), dtype=np.int64, buffer=shm.buf)
+        self.capacity = int(self.header[CAPACITY])
+        size = 2 * self.capacity
+        self.fields = {}
+        for i, name in enumerate(FIELDS):
+            offset = 8 * (HEADER + i * size)
+            dtype = 'datetime64[s]' if name == 'time' else np.float64
+            self.fields[name] = np.ndarray((size,), dtype=dtype, buffer=shm.buf, offset=offset)
+
+    @classmethod
+    def create(cls, name, capacity):
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=segment_size(capacity))
+        except FileExistsError:
+            # a previous ingestion process crashed; take over its segment
+            shm = shared_memory.SharedMemory(name=name)
+            if shm.size < segment_size(capacity):
+                shm.close()
+                shm.unlink()
+                shm = shared_memory.SharedMemory(name=name, create=True, size=segment_size(capacity))
+        header = np.ndarray((HEADER,), dtype=np.int64, buffer=shm.buf)
+        # readers wait for seed() before trusting the rows of a new generation
+        header[READY] = 0
+        header[GENERATION] = time.time_ns() ^ os.getpid()
+        header[CAPACITY] = capacity
+        header[COUNT] = 0
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+                break
+            except FileNotFoundError:
+                if deadline is not None and time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+        # readers must not unlink the segment when they exit
+        try:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+        return cls(shm, owner=False)
+
+    @property
+    def generation(self):
+        return int(self.header[GENERATION])
+
+    @property
+    def count(self):
+        return int(self.header[COUNT])
+
+    @property
+    def ready(self):
+        return bool(self.header[READY])
+
+    def append(self, time, open, close, high, low, volume):
+        count = self.count
+        index = count % self.capacity
+        for name, value in zip(FIELDS, (np.datetime64(time, 's'), open, close, high, low, volume or 0.0)):
+            field = self.fields[name]
+            field[index] = value
+            field[index + self.capacity] = value
+        self.header[COUNT] = count + 1
+
+    def seed(self, rows):
+        # the whole seed is published at once, so no reader sees a partial window
+        rows = rows[-self.capacity:]
+        for name, values in zip(FIELDS, zip(*rows)):
+            field = self.fields[name]
+            values = np.asarray(values, dtype=field.dtype)
+            field[:len(rows)] = values
+            field[self.capacity:self.capacity + len(rows)] = values
+        self.header[COUNT] = len(rows)
+        self.header[READY] = 1
+
+    def wait_ready(self, timeout=None, interval=0.01):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.ready:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(interval)
+        return True
+
+    def window(self, n=None):
+        count = self.count
+        n = min(self.capacity if n is None else n, count, self.capacity)
+        end = count % self.capacity + self.capacity
+        return count, {name: field[end - n:end] for name, field in self.fields.items()}
+
+    def is_valid(self, generation, count, n):
+        # true while none of the rows returned by window() has been overwritten; the row
+        # at the current count may be half written, so it must not be one of them
+        return (self.generation == generation and self.ready and
+                self.count - count < self.capacity - n)
+
+    def snapshot(self, n, retries=3):
+        # a private copy of the latest n rows, retried if the writer lapped it mid-copy;
+        # readers need capacity - n rows of slack for a copy to survive concurrent appends
+        for _ in range(retries):
+            generation = self.generation
+            count, view = self.window(n)
+            data = {name: values.copy() for name, values in view.items()}
+            if self.is_valid(generation, count, len(data['time'])):
+                return count, data
+        raise RuntimeError(f'ring {self.shm.name} was overwritten during {retries} copies')
+
+    def wait(self, count, timeout=None, interval=0.01):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.count == count:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(interval)
+        return True
+
+    def candles(self, n):
+        from models.window import CandleColumns
+        return CandleColumns(self.snapshot(n)[1])
+
+    def close(self):
+        self.fields = {}
+        self.header = None
+        try:
+            self.shm.close()
+        except BufferError:
+            logger.warning('action=ring_close error=views_still_exported')
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingWindow(object):
+    # stands in for RollingCandles in strategy processes: the ingestion process keeps the
+    # ring current, so the AI's trades and optimizer sweeps never read the candle tables
+    def __init__(self, ring):
+        self.ring = ring
+
+    def update(self, candle):
+        pass
+
+    def invalidate(self):
+        pass
+
+    def candles(self, n=None):
+        return self.ring.candles(self.ring.capacity - 1 if n is None else n)
@@ -0,0 +1,145 @@
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import logging
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from config import settings, constants
+
+logger = logging.getLogger(__name__)
+
+# 1m columns handed to every worker once by the pool initializer
+_minutes = None
+_resampled = {}
+
+
+def init_worker(minutes):
+    global _minutes
+    _minutes = minutes
+    _resampled.clear()
+
+
+def resampled(duration):
+    from models.rollup import resample
+    if duration not in _resampled:
+        data = _minutes
+        if duration == constants.DURATION_1M:
+            columns = (data['time'], data['open'], data['close'], data['high'], data['low'], data['volume'])
+        else:
+            columns = resample(data['time'], data['open'], data['close'],
+                               data['high'], data['low'], data['volume'], duration)
+        _resampled[duration] = columns
+    return _resampled[duration]
+
+
+def run_job(job):
+    from models.dfcandle import DataFrameCandle
+    from models.loader import to_candles
+    from tradingalgo.backtest import CombinedBacktest
+    from tradingalgo.backtest import params_to_rules
+
+    duration, past_period, metric, stop_limit_percent, num_ranking = job
+    start = time.monotonic()
+    times, opens, closes, highs, lows, volumes = (c[-past_period:] for c in resampled(duration))
+    result = {'duration': duration, 'past_period': past_period, 'candles': len(times),
+              'score': None, 'params': None}
+    if len(times) < past_period:
+        result['seconds'] = time.monotonic() - start
+        return result
+
+    df = DataFrameCandle(settings.symbol, duration)
+    # params are searched on the metric the sweep ranks by and stored under it
+    df.rank_metric = metric
+    df.candles = to_candles({'time': times, 'open': opens, 'close': closes,
+                             'high': highs, 'low': lows, 'volume': volumes})
+    params = df.optimize_params(num_ranking=num_ranking, stop_limit_percent=stop_limit_percent)
+    if params is not None:
+        # rank every (duration, params) pair on the same metric of what AI.trade would do;
+        # score orders the pairs, value is the metric itself
+        backtest = CombinedBacktest(closes, highs, lows, stop_limit_percent,
+                                    duration_seconds=constants.DURATION_SECONDS[duration], rank_metric=metric)
+        rules = params_to_rules(params.__dict__)
+        result['score'] = backtest.score(rules)
+        result['value'] = backtest.metrics(rules)[metric]
+        result['params'] = params.__dict__
+        result['first_time'] = df.candles[0].time
+        result['last_time'] = df.candles[-1].time
+    result['seconds'] = time.monotonic() - start
+    return result
+
+
+def load_minutes(symbol, durations, past_periods, end=None):
+    from models.candle import factory_candle_class
+    from models.loader import to_columns
+    from models.rollup import truncate_time
+    from utils.utils import jst_now
+
+    end = end or jst_now()
+    widest = max(durations, key=constants.DURATION_SECONDS.get)
+    span = datetime.timedelta(seconds=constants.DURATION_SECONDS[widest] * max(past_periods))
+    rows = factory_candle_class(symbol, constants.DURATION_1M).get_rows_between(
+        truncate_time(end - span, widest), end)
+    data = to_columns(rows)
+    data['volume'] = np.nan_to_num(data['volume'])
+    return data
+
+
+class DurationSweep(object):
+    def __init__(self, symbol=settings.symbol, durations=None, past_periods=None,
+                 metric='sharpe', workers=None, stop_limit_percent=settings.stop_limit_percent,
+                 num_ranking=settings.num_ranking):
+        self.symbol = symbol
+        self.durations = durations or constants.DURATIONS_ALL
+        self.past_periods = past_periods or [settings.past_period]
+        self.metric = metric
+        self.workers = workers or os.cpu_count()
+        self.stop_limit_percent = stop_limit_percent
+        self.num_ranking = num_ranking
+
+    def jobs(self):
+        return [(duration, past_period, self.metric, self.stop_limit_percent, self.num_ranking)
+                for duration in self.durations for past_period in self.past_periods]
+
+    def run_parallel(self, minutes):
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(self.workers, mp_context=context,
+                                 initializer=init_worker, initargs=(minutes,)) as executor:
+            return list(executor.map(run_job, self.jobs()))
+
+    def run_serial(self, minutes):
+        init_worker(minutes)
+        return [run_job(job) for job in self.jobs()]
+
+    def run(self, serial=False, store=True):
+        minutes = load_minutes(self.symbol, self.durations, self.past_periods)
+        report = {'minutes': len(minutes['time']), 'jobs': len(self.jobs()), 'workers': self.workers}
+
+        start = time.monotonic()
+        results = self.run_parallel(minutes)
+        report['parallel_seconds'] = time.monotonic() - start
+        if serial:
+            start = time.monotonic()
+            self.run_serial(minutes)
+            report['serial_seconds'] = time.monotonic() - start
+            report['speedup'] = report['serial_seconds'] / report['parallel_seconds']
+
+        ranked = sorted((r for r in results if r['score'] is not None), key=lambda r: r['score'], reverse=True)
+        report['ranking'] = ranked
+        report['best'] = ranked[0] if ranked else None
+        if store:
+            self.store(ranked)
+        logger.info(f'action=duration_sweep jobs={report["jobs"]} parallel={report["parallel_seconds"]:.2f} '
+                     f'serial={report.get("serial_seconds")} best={report["best"]}')
+        return report
+
+    def store(self, results):
+        from dict2obj import Dict2Obj
+        from models.params import OptimizedParams
+        from models.params import sweep_settings
+        for r in results:
+            OptimizedParams.store(self.symbol, r['duration'], r['past_period'],
+                                  r['first_time'], r['last_time'], Dict2Obj(r['params']),
+                                  sweep_settings(self.stop_limit_percent, self.num_ranking, self.metric))
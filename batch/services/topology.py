@@ -0,0 +1,262 @@
+import json
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def run_ingestion(symbol, durations, capacity):
+    from models.candle import factory_candle_class
+    from models.rollup import CandleRollup
+    from services.backfill import Backfill
+    from services.gmo_api import PublicWebSocketApi
+    from services.gmo_api import Ticker
+    from models.rollup import truncate_time
+    from services.ringbuffer import CandleRing
+    from services.ringbuffer import ring_name
+    from utils.utils import jst_now
+
+    rings = {}
+    for duration in durations:
+        ring = CandleRing.create(ring_name(symbol, duration), capacity)
+        # seed from storage so strategies have a full window right after a restart;
+        # the bucket still being built is appended by the rollup once it closes
+        current = truncate_time(jst_now(), duration)
+        candles = factory_candle_class(symbol, duration).get_latest_rows(capacity + 1)
+        ring.seed([(c.time, c.open, c.close, c.high, c.low, c.volume or 0.0)
+                   for c in candles if c.time < current])
+        rings[duration] = ring
+
+    rollup = CandleRollup(symbol, durations)
+    use_trades = getattr(settings, 'use_trades', False)
+
+    def on_message(ws, message):
+        dic = json.loads(message)
+        if dic.get('channel') == 'trades':
+            closed = rollup.on_trade(dic)
+        elif use_trades:
+            return
+        else:
+            closed = rollup.on_tick(Ticker(
+                timestamp=dic['timestamp'], ask=dic['ask'], bid=dic['bid'], high=dic['high'],
+                last=dic['last'], low=dic['low'], volume=dic['volume']))
+        for duration in closed:
+            if duration in rings:
+                rings[duration].append(*rollup.closed_candles[duration])
+
+    channels = ('ticker', 'trades') if use_trades else ('ticker',)
+
+    def on_gap(start, end):
+        threading.Thread(target=Backfill(symbol, durations).repair, args=(start, end),
+                         name='repair', daemon=True).start()
+
+    PublicWebSocketApi(channels, on_gap=on_gap).get_real_time_ticker(on_message)
+
+
+def run_strategy(symbol, duration, strategy):
+    from models.ai import AI
+    from models.dfcandle import DataFrameCandle
+    from models.window import CandleColumns
+    from services.ringbuffer import CandleRing
+    from services.ringbuffer import RingWindow
+    from services.ringbuffer import ring_name
+
+    back_test = strategy.get('back_test', settings.back_test)
+    if not back_test:
+        logger.warning(f'action=run_strategy status=live duration={duration} strategy={strategy}')
+    ring = CandleRing.attach(ring_name(symbol, duration))
+    ring.wait_ready()
+    # trades and optimizer sweeps both read the ring
+    ai = AI(
+        symbol=symbol,
+        use_percent=settings.use_percent,
+        duration=duration,
+        past_period=strategy.get('past_period', settings.past_period),
+        stop_limit_percent=strategy.get('stop_limit_percent', settings.stop_limit_percent),
+        back_test=back_test,
+        num_ranking=strategy.get('num_ranking', settings.num_ranking),
+        window=RingWindow(ring))
+    generation, count = ring.generation, ring.count
+    while True:
+        ring.wait(count, timeout=1.0)
+        if ring.generation != generation or not ring.ready:
+            # a restarted ingestion process reseeds the ring; trade again from its next candle
+            logger.info(f'action=run_strategy status=ingestion_restarted duration={duration}')
+            ring.wait_ready()
+            generation, count = ring.generation, ring.count
+            continue
+        if ring.count == count:
+            continue
+
+        try:
+            count, data = ring.snapshot(ai.past_period)
+        except RuntimeError as e:
+            # only a reseed or a missing slack laps a copy; the generation check above sorts it out
+            logger.warning(f'action=run_strategy error={e}')
+            continue
+
+        df = DataFrameCandle(symbol, duration)
+        df.candles = CandleColumns(data)
+        ai.trade(df)
+
+
+class Supervisor(object):
+    # every strategy process runs its own AI; with back_test off each of them places
+    # real orders on its own, so strategies sharing an account also share its margin
+    def __init__(self, symbol=settings.symbol, durations=None, strategies=None,
+                 capacity=None, check_interval=1.0):
+        self.symbol = symbol
+        self.durations = durations or settings.durations
+        self.strategies = strategies or getattr(settings, 'strategies', [{}])
+        longest = max(s.get('past_period', settings.past_period) for s in self.strategies)
+        # slack beyond the longest window lets a strategy copy its rows while ingestion appends
+        self.capacity = capacity or longest + getattr(settings, 'ring_slack', 64)
+        self.check_interval = check_interval
+        self.context = multiprocessing.get_context('spawn')
+        self.processes = {}
+        self.restarts = 0
+        self.running = False
+
+    def specs(self):
+        yield 'ingestion', run_ingestion, (self.symbol, self.durations, self.capacity)
+        for i, strategy in enumerate(self.strategies):
+            duration = strategy.get('duration', settings.trade_duration)
+            yield f'strategy-{i}', run_strategy, (self.symbol, duration, strategy)
+
+    def spawn(self, name, target, args):
+        process = self.context.Process(target=target, args=args, name=name, daemon=True)
+        process.start()
+        self.processes[name] = (process, target, args)
+        logger.info(f'action=spawn name={name} pid={process.pid}')
+
+    def start(self):
+        self.running = True
+        for name, target, args in self.specs():
+            self.spawn(name, target, args)
+            if name == 'ingestion':
+                # strategies attach to the rings the ingestion process creates
+                time.sleep(1.0)
+
+    def check(self):
+        if not self.running:
+            return
+        for name, (process, target, args) in list(self.processes.items()):
+            if not process.is_alive():
+                logger.error(f'action=supervisor status=died name={name} exitcode={process.exitcode}')
+                self.restarts += 1
+                self.spawn(name, target, args)
+
+    def stop(self, *_):
+        self.running = False
+        for process, _, _ in self.processes.values():
+            process.terminate()
+        for process, _, _ in self.processes.values():
+            process.join(5)
+        self.unlink()
+
+    def unlink(self):
+        from multiprocessing import shared_memory
+        from services.ringbuffer import ring_name
+        for duration in self.durations:
+            try:
+                shared_memory.SharedMemory(name=ring_name(self.symbol, duration)).unlink()
+            except FileNotFoundError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        self.start()
+        try:
+            while self.running:
+                self.check()
+                time.sleep(self.check_interval)
+        except KeyboardInterrupt:
+            self.stop()
+
+
+def optimize_load(seconds, started=None, results=None, seed=0):
+    # the live optimizer sweep over a synthetic past_period window, repeated for `seconds`
+    from models.dfcandle import DataFrameCandle
+    from models.loader import to_candles
+
+    length = settings.past_period
+    closes = 3000000 + np.cumsum(np.random.default_rng(seed).normal(0, 5000, length))
+    df = DataFrameCandle(settings.symbol, settings.trade_duration)
+    df.candles = to_candles({
+        'time': np.arange(length).astype('datetime64[m]').astype('datetime64[s]'),
+        'open': closes, 'close': closes, 'high': closes + 1000, 'low': closes - 1000,
+        'volume': np.ones(length)})
+    if started is not None:
+        started.set()
+    runs = 0
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        df.optimize_params(num_ranking=settings.num_ranking, stop_limit_percent=settings.stop_limit_percent)
+        runs += 1
+    if results is not None:
+        results.put(runs)
+    return runs
+
+
+def paced_ingest(ring, rate, seconds):
+    # the ingestion hot path: parse a ticker message and append it to the ring
+    from services.gmo_api import Ticker
+    from services.loadgen import TickerStream
+
+    stream = TickerStream()
+    interval = 1.0 / rate
+    lags = []
+    start = time.perf_counter()
+    for i in range(int(rate * seconds)):
+        scheduled = start + i * interval
+        now = time.perf_counter()
+        if now < scheduled:
+            time.sleep(scheduled - now)
+        dic = json.loads(stream.next(time.time()))
+        ticker = Ticker(timestamp=dic['timestamp'], ask=dic['ask'], bid=dic['bid'], high=dic['high'],
+                        last=dic['last'], low=dic['low'], volume=dic['volume'])
+        ring.append(ticker.time, ticker.last, ticker.last, ticker.last, ticker.last, ticker.volume)
+        lags.append(time.perf_counter() - scheduled)
+    lags = np.asarray(lags)
+    return {
+        'p50_ms': float(np.percentile(lags, 50) * 1e3),
+        'p99_ms': float(np.percentile(lags, 99) * 1e3),
+        'max_ms': float(lags.max() * 1e3),
+    }
+
+
+def benchmark(rate=500, seconds=3.0):
+    from services.ringbuffer import CandleRing
+    ring = CandleRing.create('agm_bench', 4096)
+    ring.seed([])
+    report = {}
+    try:
+        report['idle'] = paced_ingest(ring, rate, seconds)
+
+        runs = []
+        started = threading.Event()
+        thread = threading.Thread(target=lambda: runs.append(optimize_load(seconds + 0.5, started)), daemon=True)
+        thread.start()
+        started.wait()
+        report['optimizer_thread'] = paced_ingest(ring, rate, seconds)
+        thread.join()
+        report['optimizer_thread']['optimize_runs'] = runs[0]
+
+        context = multiprocessing.get_context('spawn')
+        started, results = context.Event(), context.Queue()
+        process = context.Process(target=optimize_load, args=(seconds + 0.5, started, results))
+        process.start()
+        started.wait()
+        report['optimizer_process'] = paced_ingest(ring, rate, seconds)
+        report['optimizer_process']['optimize_runs'] = results.get()
+        process.join()
+    finally:
+        ring.close()
+    return report
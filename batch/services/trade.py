@@ -1,33 +1,96 @@
+import json
 import logging
-from threading import Lock, Thread
+from threading import Lock
+from threading import Thread
 
+from services.backfill import Backfill
 from services.gmo_api import PublicWebSocketApi
 from services.gmo_api import Ticker
-from models.candle import create_candle_with_duration
+from services.worker import CoalescingWorker
 from models.ai import AI
+from models.orderbook import OrderBook
+from models.rollup import CandleRollup
 
 from config import settings
+from utils.prometheus import Counter
+from utils.prometheus import Gauge
+from utils.prometheus import Histogram
+from utils.prometheus import RateGauge
+from utils.logs import SampledLogger
+from utils.profiling import profiled
 
 logger = logging.getLogger(__name__)
+TICK_LOG = SampledLogger(logger, interval=getattr(settings, 'tick_log_interval', 10.0))
+TICKS = Counter('agm_ticks_total', 'Ticker messages received')
+TICKS_PER_SECOND = RateGauge('agm_ticks_per_second', 'Ticker messages per second over the last minute', TICKS)
+TRADE_DURATION = Histogram('agm_trade_cycle_seconds', 'Duration of AI.trade cycles')
+TRADE_COALESCED = Gauge('agm_trade_coalesced_triggers', 'Candle-close triggers merged into a pending trade cycle')
 
 
 class AiTrade(object):
-    def __init__(self):
-        self.ai = AI(
+    def __init__(self, backfill_on_start=None):
+        if backfill_on_start is None:
+            backfill_on_start = getattr(settings, 'backfill_on_start', True)
+        if backfill_on_start:
+            Backfill().warm_start(self.past_period)
+        self.ai = self.create_ai()
+        self.trade_lock = Lock()
+        self.trade_worker = CoalescingWorker(self._trade, name='trade_worker')
+        self.rollup = CandleRollup(settings.symbol, settings.durations)
+        self.use_trades = getattr(settings, 'use_trades', False)
+        self.orderbook = None
+        if getattr(settings, 'use_orderbook', False):
+            self.orderbook = OrderBook(settings.symbol)
+            if self.ai is not None:
+                self.ai.orderbook = self.orderbook
+
+    def create_ai(self):
+        return AI(
             symbol=settings.symbol,
             use_percent=settings.use_percent,
             duration=settings.trade_duration,
             past_period=settings.past_period,
             stop_limit_percent=settings.stop_limit_percent,
             back_test=settings.back_test)
-        self.trade_lock = Lock()
 
     def trade_start(self):
-        pwsa = PublicWebSocketApi()
+        self.trade_worker.start()
+        channels = ['ticker']
+        if self.use_trades:
+            channels.append('trades')
+        if self.orderbook is not None:
+            channels.append('orderbooks')
+        pwsa = PublicWebSocketApi(channels, on_gap=self.on_feed_gap)
         pwsa.get_real_time_ticker(self.write_ticker_info)
 
+    def on_feed_gap(self, start, end):
+        Thread(target=self.repair, args=(start, end), name='repair', daemon=True).start()
+
+    def repair(self, start, end):
+        Backfill().repair(start, end)
+        # repaired candles are only picked up by reloading the rolling windows
+        for ai in self.strategy_ais:
+            ai.window.invalidate()
+
+    @property
+    def past_period(self):
+        return settings.past_period
+
+    @property
+    def strategy_ais(self):
+        return [self.ai]
+
+    @profiled('write_ticker_info')
     def write_ticker_info(self, ws, message):
-        dic = eval(message)
+        dic = json.loads(message)
+        channel = dic.get('channel')
+        if channel == 'orderbooks':
+            self.orderbook.update(dic)
+            return
+        if channel == 'trades':
+            self.on_candles_closed(self.rollup.on_trade(dic))
+            return
+
         ticker = Ticker(
             timestamp=dic['timestamp'],
             ask=dic['ask'],
@@ -36,13 +99,19 @@ class AiTrade(object):
             last=dic['last'],
             low=dic['low'],
             volume=dic['volume'])
-        logger.info(f'action=write_ticker_info ticker={ticker.__dict__}')
-        for duration in settings.durations:
-            is_created = create_candle_with_duration(settings.symbol, duration, ticker)
-            if is_created and duration == settings.trade_duration:
-                thread = Thread(target=self._trade, args=(self.ai,))
-                thread.start()
-
-    def _trade(self, ai: AI):
-        with self.trade_lock:
-            ai.trade()
+        TICKS.inc()
+        TICK_LOG.log('write_ticker_info', timestamp=ticker.timestamp, last=ticker.last,
+                     bid=ticker.bid, ask=ticker.ask, volume=ticker.volume)
+        # with the trades channel on, executions alone build the candles
+        if not self.use_trades:
+            self.on_candles_closed(self.rollup.on_tick(ticker))
+
+    def on_candles_closed(self, closed_durations):
+        if settings.trade_duration in closed_durations:
+            self.trade_worker.submit()
+            TRADE_COALESCED.set(self.trade_worker.coalesced)
+
+    def _trade(self):
+        with self.trade_lock, TRADE_DURATION.time():
+            self.ai.on_candle_closed(self.rollup.closed_candles[settings.trade_duration])
+            self.ai.trade()
@@ -0,0 +1,72 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescingWorker(object):
+    def __init__(self, target, name='worker'):
+        self.target = target
+        self.name = name
+        self.triggers = 0
+        self.coalesced = 0
+        self.runs = 0
+        self.errors = 0
+        self.busy_time = 0.0
+        self._pending = False
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self):
+        with self._cond:
+            self.triggers += 1
+            if self._pending:
+                self.coalesced += 1
+                return False
+            self._pending = True
+            self._cond.notify()
+            return True
+
+    @property
+    def stats(self):
+        return {
+            'triggers': self.triggers,
+            'coalesced': self.coalesced,
+            'runs': self.runs,
+            'errors': self.errors,
+            'busy_time': self.busy_time,
+        }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stop:
+                    self._cond.wait()
+                if self._stop:
+                    return
+                self._pending = False
+
+            start = time.monotonic()
+            try:
+                self.target()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f'action={self.name} error={e}')
+            finally:
+                self.busy_time += time.monotonic() - start
+                self.runs += 1
@@ -0,0 +1,161 @@
+import base64
+import hashlib
+import logging
+import socket
+import struct
+import threading
+
+logger = logging.getLogger(__name__)
+
+GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+OP_TEXT, OP_CLOSE, OP_PING, OP_PONG = 0x1, 0x8, 0x9, 0xA
+
+
+def encode_frame(payload, opcode=OP_TEXT):
+    if isinstance(payload, str):
+        payload = payload.encode()
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+
+def recv_exact(conn, size):
+    data = b''
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('closed')
+        data += chunk
+    return data
+
+
+def read_frame(conn):
+    first, second = recv_exact(conn, 2)
+    opcode, length = first & 0x0F, second & 0x7F
+    if length == 126:
+        length, = struct.unpack('!H', recv_exact(conn, 2))
+    elif length == 127:
+        length, = struct.unpack('!Q', recv_exact(conn, 8))
+    mask = recv_exact(conn, 4) if second & 0x80 else None
+    payload = recv_exact(conn, length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return opcode, payload
+
+
+# minimal RFC 6455 server standing in for the exchange feed in tests and benchmarks
+class LocalWebSocketServer(object):
+    def __init__(self, host='127.0.0.1', port=0, on_message=None, answer_pings=True):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen()
+        self.host, self.port = self.sock.getsockname()
+        self.on_message = on_message
+        self.answer_pings = answer_pings
+        self.clients = []
+        self.messages = []
+        self.lock = threading.Lock()
+        self.connected = threading.Event()
+        self._stop = threading.Event()
+
+    @property
+    def url(self):
+        return f'ws://{self.host}:{self.port}'
+
+    def start(self):
+        threading.Thread(target=self._accept, name='local_ws_accept', daemon=True).start()
+        return self
+
+    def _accept(self):
+        while not self._stop.is_set():
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), name='local_ws_client', daemon=True).start()
+
+    def _handshake(self, conn):
+        request = b''
+        while b'\r\n\r\n' not in request:
+            chunk = conn.recv(4096)
+            if not chunk:
+                raise ConnectionError('closed')
+            request += chunk
+        headers = {}
+        for line in request.decode().split('\r\n')[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + GUID).encode()).digest())
+        conn.sendall(
+            b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n'
+            b'Connection: Upgrade\r\nSec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+
+    def _serve(self, conn):
+        try:
+            self._handshake(conn)
+            with self.lock:
+                self.clients.append(conn)
+            self.connected.set()
+            while True:
+                opcode, payload = read_frame(conn)
+                if opcode == OP_CLOSE:
+                    break
+                if opcode == OP_PING:
+                    if self.answer_pings:
+                        self._send(conn, encode_frame(payload, OP_PONG))
+                elif opcode == OP_TEXT:
+                    message = payload.decode()
+                    self.messages.append(message)
+                    if self.on_message is not None:
+                        self.on_message(self, message)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self._drop(conn)
+
+    def _send(self, conn, frame):
+        try:
+            conn.sendall(frame)
+            return True
+        except OSError:
+            self._drop(conn)
+            return False
+
+    def _drop(self, conn):
+        with self.lock:
+            if conn in self.clients:
+                self.clients.remove(conn)
+            if not self.clients:
+                self.connected.clear()
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+    def broadcast(self, message):
+        frame = encode_frame(message)
+        with self.lock:
+            clients = list(self.clients)
+        return sum(self._send(conn, frame) for conn in clients)
+
+    def disconnect_all(self):
+        with self.lock:
+            clients = list(self.clients)
+        for conn in clients:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._drop(conn)
+
+    def stop(self):
+        self._stop.set()
+        self.disconnect_all()
+        self.sock.close()
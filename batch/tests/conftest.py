@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+import time
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+
+# tests never touch a real settings.py or its database
+DATABASE_DIR = tempfile.mkdtemp(prefix='agm-test-')
+settings = types.ModuleType('config.settings')
+settings.__dict__.update(
+    symbol='BTC',
+    api_key='',
+    secret_key='',
+    database_url=f'sqlite:///{os.path.join(DATABASE_DIR, "test.db")}',
+    log_path=None,
+    num_ranking=3,
+    past_period=100,
+    durations=['1m', '5m', '15m', '30m', '1h'],
+    trade_duration='1m',
+    use_percent=0.9,
+    stop_limit_percent=0.99,
+    back_test=True,
+    size=0.01,
+    execution_type='MARKET',
+    price=None,
+    loss_cut_price=None,
+)
+sys.modules['config.settings'] = settings
+config.settings = settings
+
+
+@pytest.fixture
+def db():
+    from models.base import Base, engine, init_db
+    init_db()
+    yield engine
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def non_jst_host(monkeypatch):
+    # local time 13-14 hours behind JST, so local now() can never pass for JST
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
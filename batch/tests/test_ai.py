@@ -0,0 +1,24 @@
+from dict2obj import Dict2Obj
+
+from models.ai import AI
+from models.dfcandle import DataFrameCandle
+from models.window import WindowCandle
+
+
+class EmptySweep(DataFrameCandle):
+    def optimize_params(self, deadline=None, num_ranking=None, stop_limit_percent=None):
+        return None
+
+
+def test_empty_revalidation_keeps_previous_params(db):
+    ai = AI('BTC', 0.9, '1m', 10, 0.99, back_test=True)
+    ai.optimizer.stop()
+    previous = Dict2Obj({'ema_enable': True})
+    ai.optimized_trade_params = previous
+
+    df = EmptySweep('BTC', '1m')
+    df.candles = [WindowCandle(None, 1.0, 1.0, 1.0, 1.0, 1.0)]
+    ai.window_frame = lambda: df
+
+    assert ai.update_optimize_params() is None
+    assert ai.optimized_trade_params is previous
@@ -0,0 +1,40 @@
+import datetime
+
+from models.candle import factory_candle_class
+from services.backfill import Backfill
+from utils.utils import jst_now
+
+from config import constants
+
+
+class KlineApi(object):
+    def __init__(self, times):
+        self.times = times
+        self.dates = []
+
+    def get_klines(self, duration, date, symbol=None):
+        self.dates.append(date)
+        return [{
+            'openTime': str(int((t - datetime.timedelta(hours=constants.DIFF_JST_FROM_UTC))
+                                .replace(tzinfo=datetime.timezone.utc).timestamp() * 1000)),
+            'open': '100', 'close': '101', 'high': '102', 'low': '99', 'volume': '1',
+        } for t in self.times]
+
+
+def test_fill_duration_repairs_gap_before_restart(db, non_jst_host):
+    cls = factory_candle_class('BTC', constants.DURATION_1M)
+    end = jst_now().replace(second=0, microsecond=0)
+    minutes = [end - datetime.timedelta(minutes=i) for i in range(1, 31)]
+    # the feed was down for the last five closed minutes before the restart
+    missing = minutes[:5]
+    for t in minutes[5:]:
+        cls.create(t, 100, 100, 100, 100, 1)
+
+    api = KlineApi(minutes)
+    gaps, filled = Backfill(durations=[constants.DURATION_1M], api=api).fill_duration(
+        constants.DURATION_1M, 30)
+
+    assert gaps == 1
+    assert filled == len(missing)
+    stored = cls.get_times_between(minutes[-1], end)
+    assert stored == sorted(minutes)
@@ -0,0 +1,57 @@
+import datetime
+import random
+
+from dict2obj import Dict2Obj
+import numpy as np
+
+from config import constants
+from models.ai import AI
+from models.dfcandle import DataFrameCandle
+from models.dfcandle import DEFAULT_PARAMS
+from models.events import SignalEvents
+from models.window import WindowCandle
+from tradingalgo.backtest import CombinedBacktest
+from tradingalgo.backtest import FAMILIES
+from tradingalgo.backtest import PARAM_GRIDS
+from tradingalgo.backtest import rules_to_params
+
+
+def random_walk(length, seed):
+    rng = np.random.default_rng(seed)
+    closes = 3000000 + np.cumsum(rng.normal(0, 5000, length))
+    return closes, closes + rng.random(length) * 3000, closes - rng.random(length) * 3000
+
+
+def ai_trades(ai, df, rules):
+    # the positions AI.trade opens and closes in back test mode, as candle indices
+    ai.signal_events = SignalEvents()
+    ai.stop_limit = 0
+    ai.optimized_trade_params = Dict2Obj(rules_to_params(rules, DEFAULT_PARAMS))
+    ai.trade(df)
+    index = {candle.time: i for i, candle in enumerate(df.candles)}
+    signals = ai.signal_events.signals
+    return ([index[s.time] for s in signals if s.side == constants.BUY],
+            [index[s.time] for s in signals if s.side == constants.SELL])
+
+
+def test_combined_backtest_matches_ai_trade(db):
+    length, stop_limit_percent = 1000, 0.995
+    closes, highs, lows = random_walk(length, seed=1)
+    start = datetime.datetime(2024, 1, 1)
+    df = DataFrameCandle('BTC', '1m')
+    df.candles = [WindowCandle(start + datetime.timedelta(minutes=i), c, c, h, l, 1.0)
+                  for i, (c, h, l) in enumerate(zip(closes.tolist(), highs.tolist(), lows.tolist()))]
+
+    ai = AI('BTC', 0.9, '1m', length, stop_limit_percent, back_test=True)
+    ai.optimizer.stop()
+    backtest = CombinedBacktest(closes, highs, lows, stop_limit_percent)
+
+    picker = random.Random(0)
+    trades = 0
+    for _ in range(200):
+        families = picker.sample(FAMILIES, picker.randint(1, len(FAMILIES)))
+        rules = {family: picker.choice(PARAM_GRIDS[family]) for family in families}
+        entries, exits = backtest.run(rules)
+        assert (entries.tolist(), exits.tolist()) == ai_trades(ai, df, rules), rules
+        trades += len(entries)
+    assert trades > 0
@@ -0,0 +1,49 @@
+import datetime
+import random
+
+from config import constants
+from models.events import SignalEvent
+from models.events import SignalEvents
+
+
+def recomputed_profit(signals):
+    # the profit property as it was before the running sums: a full pass over every signal
+    total, before_sell, is_holding = 0.0, 0.0, False
+    for i, signal in enumerate(signals):
+        if i == 0 and signal.side == constants.SELL:
+            continue
+        if signal.side == constants.BUY:
+            total -= signal.price * signal.size
+            is_holding = True
+        if signal.side == constants.SELL:
+            total += signal.price * signal.size
+            is_holding = False
+            before_sell = total
+    return before_sell if is_holding else total
+
+
+def test_bounded_profit_matches_full_recomputation():
+    picker = random.Random(0)
+    start = datetime.datetime(2024, 1, 1)
+    for _ in range(50):
+        bounded = SignalEvents(max_signals=1)
+        signals = []
+        for i in range(picker.randint(1, 40)):
+            time = start + datetime.timedelta(minutes=i)
+            price = picker.uniform(1000, 2000)
+            if picker.random() < 0.5:
+                added = bounded.buy(time, 'BTC', price, 0.01, save=False)
+            else:
+                added = bounded.sell(time, 'BTC', price, 0.01, save=False)
+            if added:
+                signals.append(bounded.signals[-1])
+        assert len(bounded.signals) == min(1, len(signals))
+        assert bounded.profit == recomputed_profit(signals)
+
+
+def test_loaded_signals_seed_the_running_sums():
+    start = datetime.datetime(2024, 1, 1)
+    signals = [SignalEvent(time=start + datetime.timedelta(minutes=i), symbol='BTC', side=side, price=price, size=1.0)
+               for i, (side, price) in enumerate([(constants.SELL, 90.0), (constants.BUY, 100.0),
+                                                  (constants.SELL, 120.0), (constants.BUY, 110.0)])]
+    assert SignalEvents(list(signals), max_signals=1).profit == recomputed_profit(signals) == 20.0
@@ -0,0 +1,109 @@
+import datetime
+import json
+import threading
+import time
+
+from services.gmo_api import PrivateWebSocketApi
+from services.gmo_api import PublicWebSocketApi
+from services.gmo_api import WS_STALLS
+from services.wsserver import LocalWebSocketServer
+
+
+def execution(order_id, price=100.0, size=1.0, executed=1.0, ordered=1.0):
+    return json.dumps({
+        'channel': 'executionEvents', 'orderId': order_id, 'executionPrice': str(price),
+        'executionSize': str(size), 'orderExecutedSize': str(executed), 'orderSize': str(ordered)})
+
+
+def test_unclaimed_executions_are_bounded():
+    stream = PrivateWebSocketApi(api=object(), max_orders=10)
+    for order_id in range(1000):
+        stream.on_message(None, execution(order_id))
+    assert len(stream.fills) == len(stream.completed) == len(stream.updated) == 10
+    assert stream.wait_price(999, 0) == 100.0
+    assert stream.wait_price(0, 0) is None
+
+
+def test_unclaimed_executions_expire_by_age(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr('services.gmo_api.time.monotonic', lambda: clock[0])
+    stream = PrivateWebSocketApi(api=object(), max_age=60)
+    stream.on_message(None, execution(1))
+    clock[0] += 61
+    stream.on_message(None, execution(2, price=200.0))
+    assert set(stream.fills) == {'2'}
+    assert stream.wait_price(2, 0) == 200.0
+    assert not stream.fills and not stream.completed and not stream.updated
+
+
+def test_flagged_gaps_are_bounded():
+    stream = PublicWebSocketApi(max_gaps=5)
+    for minute in range(0, 600, 2):
+        stream.track(json.dumps({'timestamp': f'2024-01-01T{minute // 60:02d}:{minute % 60:02d}:00.000Z'}))
+    assert len(stream.gaps) == 5
+    assert stream.gaps[-1] == (datetime.datetime(2024, 1, 1, 18, 57), datetime.datetime(2024, 1, 1, 18, 58))
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def subscriptions(server):
+    return [m for m in server.messages if json.loads(m).get('command') == 'subscribe']
+
+
+def run_feed(server, on_message=None, **kwargs):
+    api = PublicWebSocketApi(ws_path=server.url, backoff_base=0.05, backoff_max=0.1, trace=False, **kwargs)
+    threading.Thread(target=api.get_real_time_ticker, args=(on_message or (lambda ws, message: None),),
+                     daemon=True).start()
+    return api
+
+
+def test_a_dropped_connection_reconnects_and_resubscribes():
+    server = LocalWebSocketServer().start()
+    api = run_feed(server)
+    try:
+        assert wait_for(lambda: len(subscriptions(server)) == 1)
+        server.disconnect_all()
+        assert wait_for(lambda: len(subscriptions(server)) == 2)
+        assert wait_for(lambda: api.disconnected_at is None)
+        assert api.disconnected_time > 0
+    finally:
+        api.stop()
+        server.stop()
+
+
+def test_a_silent_feed_trips_the_stall_watchdog():
+    server = LocalWebSocketServer(answer_pings=False).start()
+    stalls = WS_STALLS.value
+    # a short ping timeout also bounds how long run_forever takes to notice the close
+    api = run_feed(server, stall_timeout=0.4, ping_interval=2, ping_timeout=1)
+    try:
+        assert wait_for(lambda: len(subscriptions(server)) == 1)
+        assert wait_for(lambda: WS_STALLS.value > stalls)
+        # the watchdog closes the connection and the feed comes back on its own
+        assert wait_for(lambda: len(subscriptions(server)) >= 2)
+    finally:
+        api.stop()
+        server.stop()
+
+
+def test_a_timestamp_gap_is_reported():
+    server = LocalWebSocketServer().start()
+    gaps, received = [], []
+    api = run_feed(server, on_message=lambda ws, message: received.append(message),
+                   on_gap=lambda start, end: gaps.append((start, end)))
+    try:
+        assert wait_for(lambda: len(subscriptions(server)) == 1)
+        for minute in (0, 1, 5):
+            server.broadcast(json.dumps({'channel': 'ticker', 'timestamp': f'2024-01-01T00:{minute:02d}:30.000Z'}))
+        assert wait_for(lambda: len(received) == 3)
+        assert gaps == [(datetime.datetime(2024, 1, 1, 9, 2), datetime.datetime(2024, 1, 1, 9, 5))]
+    finally:
+        api.stop()
+        server.stop()
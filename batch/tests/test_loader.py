@@ -0,0 +1,26 @@
+import datetime
+
+from models.candle import factory_candle_class
+from models.loader import CandleLoader
+
+from config import constants
+
+
+def test_month_cache_is_bounded(db):
+    cls = factory_candle_class('BTC', constants.DURATION_1H)
+    for month in range(1, 6):
+        cls.create(datetime.datetime(2021, month, 2), 100, 100, 100, 100, 1)
+
+    loader = CandleLoader(max_months=2)
+    fetched = []
+    fetch = loader.fetch
+    loader.fetch = lambda duration, start, end: fetched.append(start) or fetch(duration, start, end)
+
+    data = loader.load(constants.DURATION_1H, end=datetime.datetime(2021, 6, 1))
+    assert len(data['time']) == 5
+    assert list(loader.memory) == [(constants.DURATION_1H, datetime.datetime(2021, 4, 1)),
+                                   (constants.DURATION_1H, datetime.datetime(2021, 5, 1))]
+
+    fetched.clear()
+    loader.load(constants.DURATION_1H, datetime.datetime(2021, 4, 1), datetime.datetime(2021, 6, 1))
+    assert fetched == []
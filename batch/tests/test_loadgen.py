@@ -0,0 +1,26 @@
+import datetime
+
+import pytest
+
+from models.candle import factory_candle_class
+from services.loadgen import trade_target
+
+from config import constants
+
+
+def test_trade_target_refuses_a_database_with_candles(db):
+    factory_candle_class('BTC', constants.DURATION_1H).create(datetime.datetime(2024, 1, 1), 100, 100, 100, 100, 1)
+    with pytest.raises(RuntimeError, match='empty database'):
+        trade_target()
+
+
+def test_trade_target_requires_back_test(db, monkeypatch):
+    monkeypatch.setattr('services.loadgen.settings.back_test', False)
+    with pytest.raises(RuntimeError, match='back_test'):
+        trade_target()
+
+
+def test_trade_target_runs_on_an_empty_database(db):
+    handler, stop = trade_target()
+    stop()
+    assert callable(handler)
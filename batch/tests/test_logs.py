@@ -0,0 +1,95 @@
+import atexit
+import logging
+import queue
+import time
+
+from utils.logs import LOG_DROPPED
+from utils.logs import LOG_SUPPRESSED
+from utils.logs import NonBlockingQueueHandler
+from utils.logs import SampledLogger
+from utils.logs import setup_logging
+
+
+class Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def sampled_logger(name, **kwargs):
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = Records()
+    logger.handlers = [handler]
+    return SampledLogger(logger, **kwargs), handler
+
+
+def test_every_nth_call_is_logged():
+    sampled, handler = sampled_logger('agm.test.every', every=3)
+    suppressed = LOG_SUPPRESSED.value
+    for i in range(9):
+        sampled.log('tick', i=i)
+    assert [r.getMessage() for r in handler.records] == ['action=tick i=0', 'action=tick i=3', 'action=tick i=6']
+    assert handler.records[0].fields == {'i': 0}
+    assert LOG_SUPPRESSED.value - suppressed == 6
+
+
+def test_interval_limits_the_rate(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr('utils.logs.time.monotonic', lambda: clock[0])
+    sampled, handler = sampled_logger('agm.test.interval', interval=1.0)
+    for _ in range(50):
+        sampled.log('tick')
+        clock[0] += 0.1
+    assert len(handler.records) == 5
+
+
+def test_disabled_level_skips_formatting():
+    sampled, handler = sampled_logger('agm.test.debug', every=1, level=logging.DEBUG)
+    sampled.log('tick', value=object())
+    assert handler.records == [] and sampled.calls == 0
+
+
+def test_full_queue_drops_instead_of_blocking():
+    records = queue.Queue(2)
+    logger = logging.getLogger('agm.test.queue')
+    logger.propagate = False
+    logger.handlers = [NonBlockingQueueHandler(records)]
+    dropped = LOG_DROPPED.value
+    start = time.perf_counter()
+    for i in range(10):
+        logger.warning('record %d', i)
+    assert time.perf_counter() - start < 1.0
+    assert records.qsize() == 2
+    assert LOG_DROPPED.value - dropped == 8
+    assert records.get_nowait().msg == 'record 0'
+
+
+def test_listener_flushes_every_record_on_shutdown(tmp_path):
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    path = tmp_path / 'agm.log'
+    listener = setup_logging(str(path), fmt='%(levelname)s %(message)s')
+    try:
+        logger = logging.getLogger('agm.test.listener')
+        for i in range(1000):
+            logger.info('record %d', i)
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            logger.exception('failed')
+    finally:
+        listener.stop()
+        atexit.unregister(listener.stop)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        for handler in handlers:
+            root.addHandler(handler)
+        root.setLevel(level)
+    lines = path.read_text().splitlines()
+    assert lines[0] == 'INFO record 0' and 'INFO record 999' in lines
+    assert 'ERROR failed' in lines and lines[-1] == 'ValueError: boom'
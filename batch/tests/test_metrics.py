@@ -0,0 +1,54 @@
+import datetime
+
+import numpy as np
+
+from models.events import SignalEvents
+from tradingalgo.metrics import DIRECTIONS
+from tradingalgo.metrics import compute_metrics
+from tradingalgo.metrics import positions_from_signals
+from tradingalgo.metrics import rank_score
+
+
+def metrics_for(closes, positions):
+    return compute_metrics(np.asarray(closes, dtype=np.float64), np.asarray(positions, dtype=np.float64), 60)
+
+
+def test_every_metric_has_a_direction():
+    assert set(DIRECTIONS) == set(metrics_for([1, 2], [0, 0]))
+
+
+def test_smaller_drawdown_ranks_higher():
+    smooth = metrics_for([100, 101, 102, 103, 104], [1, 1, 1, 1, 0])
+    choppy = metrics_for([100, 90, 110, 95, 106], [1, 1, 1, 1, 0])
+    assert smooth['max_drawdown'] < choppy['max_drawdown']
+    assert rank_score(smooth, 'max_drawdown') > rank_score(choppy, 'max_drawdown')
+
+
+def test_fewer_trades_rank_higher_for_the_same_profit():
+    once = metrics_for([100, 102, 104, 106, 108], [1, 1, 1, 1, 0])
+    churn = metrics_for([100, 102, 104, 106, 108], [1, 0, 1, 0, 0])
+    assert rank_score(once, 'trade_count') > rank_score(churn, 'trade_count') > 0
+
+
+def test_losing_runs_never_score():
+    losing = metrics_for([100, 99, 98], [1, 1, 0])
+    for name in DIRECTIONS:
+        assert rank_score(losing, name) == 0.0
+
+
+def test_positions_from_signals_takes_sides_as_flags():
+    times = np.arange(6).astype('datetime64[m]')
+    positions = positions_from_signals(times, times[[1, 4]], [True, False])
+    assert positions.tolist() == [0, 1, 1, 1, 0, 0]
+
+
+def test_signal_events_metrics_skip_a_leading_sell():
+    start = datetime.datetime(2024, 1, 1)
+    times = np.array([start + datetime.timedelta(minutes=i) for i in range(6)], dtype='datetime64[s]')
+    events = SignalEvents()
+    events.sell(times[0].astype(datetime.datetime), 'BTC', 100.0, 1.0, save=False)
+    events.buy(times[1].astype(datetime.datetime), 'BTC', 100.0, 1.0, save=False)
+    events.sell(times[3].astype(datetime.datetime), 'BTC', 110.0, 1.0, save=False)
+    metrics = events.metrics(times, np.array([100, 100, 105, 110, 110, 110], dtype=np.float64), 60)
+    assert metrics['trade_count'] == 1
+    assert metrics['profit'] == events.profit == 10.0
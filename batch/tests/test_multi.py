@@ -0,0 +1,77 @@
+import datetime
+
+from dict2obj import Dict2Obj
+import numpy as np
+
+from config import settings
+
+from models.candle import factory_candle_class
+from models.events import SignalEvents
+from models.params import OptimizedParams
+from services.multi import MultiStrategyTrade
+
+
+def add_candles(count=100):
+    cls = factory_candle_class('BTC', '1m')
+    start = datetime.datetime(2021, 1, 1, 9)
+    index = np.arange(count)
+    prices = 3000000 + 50000 * np.sin(index / 3) + np.random.default_rng(1).normal(0, 5000, len(index))
+    for i, price in enumerate(prices.tolist()):
+        cls.create(start + datetime.timedelta(minutes=i), price, price, price + 1000, price - 1000, 1)
+    return cls
+
+
+def test_strategies_share_one_window_and_sweep(db, monkeypatch):
+    monkeypatch.setattr(settings, 'backfill_on_start', False, raising=False)
+    cls = add_candles()
+
+    loads = []
+    get_latest_rows = cls.get_latest_rows.__func__
+    monkeypatch.setattr(cls, 'get_latest_rows', classmethod(
+        lambda c, limit=100: loads.append(limit) or get_latest_rows(c, limit)))
+
+    trade = MultiStrategyTrade([{'past_period': 40}, {'past_period': 80}, {'past_period': 40}])
+    trade.optimizer.stop()
+
+    assert trade.past_period == 80
+    assert all(ai.window is trade.window for ai in trade.ais)
+    assert len(loads) == 1 and loads[0] > 80
+    assert [len(ai.window_frame().candles) for ai in trade.ais] == [40, 80, 40]
+    assert trade.ais[0].optimized_trade_params is not None
+    assert trade.ais[0].optimized_trade_params is trade.ais[2].optimized_trade_params
+
+
+def test_strategies_with_the_same_period_keep_their_own_params(db, monkeypatch):
+    monkeypatch.setattr(settings, 'backfill_on_start', False, raising=False)
+    add_candles()
+    strategies = [{'past_period': 40, 'stop_limit_percent': 0.99, 'num_ranking': 3},
+                  {'past_period': 40, 'stop_limit_percent': 0.98, 'num_ranking': 3},
+                  {'past_period': 40, 'stop_limit_percent': 0.99, 'num_ranking': 2}]
+    trade = MultiStrategyTrade(strategies)
+    trade.optimizer.stop()
+    # mark every stored row so a restart shows which row each strategy reads
+    for i, ai in enumerate(trade.ais):
+        OptimizedParams.store('BTC', '1m', 40, datetime.datetime(2021, 1, 1, 10),
+                              datetime.datetime(2021, 1, 1, 10, 39), Dict2Obj({'strategy': i}), ai.sweep_settings())
+
+    restarted = MultiStrategyTrade(strategies)
+    restarted.optimizer.stop()
+    assert [ai.optimized_trade_params.strategy for ai in restarted.ais] == [0, 1, 2]
+
+
+def test_paper_strategies_keep_a_bounded_signal_list(db, monkeypatch):
+    monkeypatch.setattr(settings, 'backfill_on_start', False, raising=False)
+    add_candles()
+    trade = MultiStrategyTrade([{'past_period': 80}])
+    trade.optimizer.stop()
+    ai = trade.ais[0]
+    df = ai.window_frame()
+    ai.trade(df)
+    bounded = ai.signal_events
+
+    # the same window replayed with an unbounded list
+    ai.signal_events, ai.stop_limit = SignalEvents(), 0
+    ai.trade(df)
+    assert len(ai.signal_events.signals) > 1
+    assert len(bounded.signals) == 1
+    assert bounded.profit == ai.signal_events.profit
@@ -0,0 +1,84 @@
+import threading
+import time
+
+from services.optimizer import OptimizeScheduler
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_each_run_gets_a_deadline_and_a_timeout_counts_as_no_params():
+    deadlines = []
+
+    def optimize(deadline):
+        deadlines.append(deadline)
+        raise TimeoutError('optimize_params exceeded its time budget')
+
+    scheduler = OptimizeScheduler(optimize, timeout=30)
+    start = time.monotonic()
+    assert scheduler.run_once() is None
+    assert start + 30 <= deadlines[0] <= time.monotonic() + 30
+    assert scheduler.run_count == 1
+
+    OptimizeScheduler(optimize).run_once()
+    assert deadlines[1] is None
+
+
+def test_an_empty_sweep_is_retried():
+    results = [None, None, {'ema_enable': True}]
+    calls = []
+
+    def optimize(deadline):
+        calls.append(deadline)
+        return results[len(calls) - 1]
+
+    scheduler = OptimizeScheduler(optimize, retry_interval=0.02)
+    scheduler.start()
+    scheduler.request()
+    try:
+        assert wait_for(lambda: scheduler.last_params is not None)
+        # with params and no interval the scheduler waits for the next request
+        time.sleep(0.1)
+        assert len(calls) == 3
+    finally:
+        scheduler.stop()
+
+
+def test_a_request_during_a_sweep_runs_one_more_sweep():
+    running, release = threading.Event(), threading.Event()
+    calls = []
+
+    def optimize(deadline):
+        calls.append(deadline)
+        running.set()
+        release.wait(5)
+        return {'ema_enable': True}
+
+    scheduler = OptimizeScheduler(optimize)
+    scheduler.start()
+    scheduler.request()
+    try:
+        assert running.wait(5)
+        for _ in range(3):
+            scheduler.request()
+        release.set()
+        assert wait_for(lambda: scheduler.run_count == 2)
+        time.sleep(0.1)
+        assert scheduler.run_count == 2
+    finally:
+        scheduler.stop()
+
+
+def test_stop_ends_the_thread():
+    scheduler = OptimizeScheduler(lambda deadline: {'ema_enable': True}, interval=60)
+    scheduler.start()
+    scheduler.stop()
+    scheduler._thread.join(5)
+    assert not scheduler._thread.is_alive()
+    assert scheduler.run_count == 0
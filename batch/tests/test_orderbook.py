@@ -0,0 +1,42 @@
+import threading
+
+from models.orderbook import OrderBook
+from models.orderbook import sample_message
+
+
+def test_depth_index_is_built_with_the_snapshot():
+    book = OrderBook('BTC', depth=10)
+    book.update(sample_message(10, mid=1000.0))
+    assert book.depth_at(1001) == 0.01
+    assert book.depth_at('999') == 0.02
+    assert book.depth_at(1500) == 0.0
+
+    book.update(sample_message(3, mid=2000.0))
+    assert len(book.levels) == 6
+    assert book.depth_at(1001) == 0.0
+    assert book.depth_at(2003) == 0.01
+
+
+def test_readers_never_see_a_half_updated_book():
+    book = OrderBook('BTC', depth=50)
+    book.update(sample_message(50, mid=1000.0))
+    stop = threading.Event()
+
+    def writer():
+        mid = 1000.0
+        while not stop.is_set():
+            mid = 3000.0 if mid == 1000.0 else 1000.0
+            book.update(sample_message(50, mid=mid))
+
+    thread = threading.Thread(target=writer, daemon=True)
+    thread.start()
+    try:
+        for _ in range(20000):
+            snapshot = book.snapshot
+            assert snapshot.ask_prices[0] - snapshot.bid_prices[0] == 2.0
+            assert book.spread == 2.0
+            assert book.mid in (1000.0, 3000.0)
+    finally:
+        stop.set()
+        thread.join(5)
+    assert book.updates > 1
@@ -0,0 +1,20 @@
+import datetime
+
+from models.candle import factory_candle_class
+from models.panel import IndicatorPanel
+from utils.utils import jst_now
+
+from config import constants
+
+
+def test_panel_loads_up_to_the_latest_jst_candle(db, non_jst_host):
+    cls = factory_candle_class('BTC', constants.DURATION_1M)
+    end = jst_now().replace(second=0, microsecond=0)
+    for i in range(1, 121):
+        cls.create(end - datetime.timedelta(minutes=i), i, i, i, i, 1)
+
+    panel = IndicatorPanel(durations=[constants.DURATION_1M, constants.DURATION_5M], past_period=10).load()
+
+    latest = panel.frames[constants.DURATION_1M]['time'][-1].astype(datetime.datetime)
+    assert latest == end - datetime.timedelta(minutes=1)
+    assert len(panel.frames[constants.DURATION_5M]['time']) == 10
@@ -0,0 +1,32 @@
+import datetime
+
+from dict2obj import Dict2Obj
+
+from models.params import OPTIMIZER_SOURCES
+from models.params import OptimizedParams
+from models.params import sweep_settings
+
+from config import constants
+
+
+def store(sweep):
+    return OptimizedParams.store('BTC', constants.DURATION_1M, 100, datetime.datetime(2024, 1, 1),
+                                 datetime.datetime(2024, 1, 1, 1), Dict2Obj({'ema_enable': True}), sweep)
+
+
+def test_cached_params_follow_the_sweep_settings(db, monkeypatch):
+    store(sweep_settings(0.99, 3))
+    cached = OptimizedParams.load('BTC', constants.DURATION_1M, 100, sweep_settings(0.99, 3))
+    latest = datetime.datetime(2024, 1, 1, 1, 5)
+    assert cached.is_fresh(latest, 10, sweep_settings(0.99, 3))
+    assert not cached.is_fresh(latest, 10, sweep_settings(0.98, 3))
+    assert not cached.is_fresh(latest, 10, sweep_settings(0.99, 2))
+
+    monkeypatch.setattr('models.params.settings.rank_metric', 'sharpe', raising=False)
+    assert not cached.is_fresh(latest, 10, sweep_settings(0.99, 3))
+    monkeypatch.setattr('models.params.settings.optimize_mode', 'combined', raising=False)
+    assert not cached.is_fresh(latest, 10, sweep_settings(0.99, 3, rank_metric='profit'))
+
+
+def test_code_version_covers_the_backtest_modules():
+    assert {'tradingalgo/backtest.py', 'tradingalgo/indicators.py', 'tradingalgo/metrics.py'} <= set(OPTIMIZER_SOURCES)
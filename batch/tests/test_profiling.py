@@ -0,0 +1,32 @@
+import threading
+
+from utils.profiling import Profiler
+
+
+def test_overlapping_calls_from_threads_run_unprofiled():
+    profiler = Profiler()
+    inside = threading.Event()
+    release = threading.Event()
+    results = []
+
+    def slow():
+        inside.set()
+        release.wait(5)
+        return 'slow'
+
+    thread = threading.Thread(target=lambda: results.append(profiler.record('slow', slow)))
+    thread.start()
+    assert inside.wait(5)
+    # a second Profile.enable() here would raise on Python 3.12+
+    assert profiler.record('fast', lambda: 'fast') == 'fast'
+    release.set()
+    thread.join(5)
+
+    assert results == ['slow']
+    assert set(profiler.stats) == {'slow'}
+
+
+def test_nested_calls_run_unprofiled():
+    profiler = Profiler()
+    assert profiler.record('outer', lambda: profiler.record('inner', lambda: 1)) == 1
+    assert set(profiler.stats) == {'outer'}
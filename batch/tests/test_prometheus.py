@@ -0,0 +1,60 @@
+import urllib.request
+
+from utils.prometheus import Counter
+from utils.prometheus import Histogram
+from utils.prometheus import RateGauge
+from utils.prometheus import Registry
+from utils.prometheus import start_http_server
+
+
+def test_rate_does_not_depend_on_scrapes(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr('utils.prometheus.time.monotonic', lambda: clock[0])
+    registry = Registry()
+    ticks = Counter('ticks_total', 'ticks', registry=registry)
+    rate = RateGauge('ticks_per_second', 'ticks per second', ticks, window=10, registry=registry)
+
+    for _ in range(30):
+        clock[0] += 1
+        ticks.inc(5)
+        rate.rate()
+    # a second scraper, or a manual curl, right after the first one sees the same rate
+    assert rate.rate() == rate.rate() == 5.0
+    assert len(rate.history) <= 12
+
+    clock[0] += 10
+    assert rate.rate() == 0.0
+
+
+def test_metrics_endpoint_serves_the_exposition_format():
+    registry = Registry()
+    orders = Counter('orders_total', 'orders sent', registry=registry)
+    latency = Histogram('order_seconds', 'order latency', buckets=(0.1, 1.0), registry=registry)
+    orders.inc(3)
+    latency.observe(0.05)
+    latency.observe(0.5)
+
+    server = start_http_server(0, registry=registry)
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{server.server_port}/metrics', timeout=5) as resp:
+            assert resp.headers['Content-Type'].startswith('text/plain')
+            body = resp.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    samples = {}
+    for line in body.splitlines():
+        if not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    assert '# TYPE orders_total counter' in body
+    assert '# TYPE order_seconds histogram' in body
+    assert samples == {
+        'orders_total': 3.0,
+        'order_seconds_bucket{le="0.1"}': 1.0,
+        'order_seconds_bucket{le="1.0"}': 2.0,
+        'order_seconds_bucket{le="+Inf"}': 2.0,
+        'order_seconds_sum': 0.55,
+        'order_seconds_count': 2.0,
+    }
@@ -0,0 +1,19 @@
+from services.ratelimit import RequestScheduler
+
+
+def test_orders_do_not_wait_behind_queries(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr('services.ratelimit.time.monotonic', lambda: clock[0])
+    scheduler = RequestScheduler(get_rate=2, post_rate=2)
+    scheduler.acquire('GET')
+    scheduler.acquire('GET')
+    # the GET budget is spent but an order still goes straight out
+    assert scheduler.acquire('POST') == 0.0
+    assert scheduler.buckets['GET'].tokens < 1
+
+
+def test_bucket_waits_for_refill():
+    scheduler = RequestScheduler(get_rate=50)
+    waits = [scheduler.acquire('GET') for _ in range(51)]
+    assert max(waits[:50]) < 0.01
+    assert waits[-1] > 0.005
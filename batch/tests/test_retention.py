@@ -0,0 +1,25 @@
+import datetime
+
+from models.candle import factory_candle_class
+from models.retention import RetentionManager
+from utils.utils import jst_now
+
+from config import constants
+
+
+def test_retention_cutoff_follows_jst(db, non_jst_host):
+    cls = factory_candle_class('BTC', constants.DURATION_1M)
+    now = jst_now().replace(second=0, microsecond=0)
+    # older than 90 days in JST, but not yet in New York local time
+    expired = now - datetime.timedelta(days=90, hours=6)
+    kept = now - datetime.timedelta(days=89)
+    for time in (expired, kept):
+        cls.create(time, 100, 100, 100, 100, 1)
+
+    manager = RetentionManager(retention_days={constants.DURATION_1M: 90})
+    report = manager.run_once()
+
+    assert report[constants.DURATION_1M] == 1
+    assert cls.get_oldest_time() == kept
+    hourly = factory_candle_class('BTC', constants.DURATION_1H)
+    assert hourly.get(expired.replace(minute=0)) is not None
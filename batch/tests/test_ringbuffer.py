@@ -0,0 +1,96 @@
+import datetime
+import os
+
+import numpy as np
+import pytest
+
+from models.ai import AI
+from models.candle import factory_candle_class
+from services.ringbuffer import CandleRing
+from services.ringbuffer import RingWindow
+
+
+@pytest.fixture
+def ring(request):
+    ring = CandleRing.create(f'agm_test_{os.getpid()}_{request.node.name}'[:30], 8)
+    yield ring
+    ring.close()
+
+
+def rows(count, start=0):
+    base = datetime.datetime(2021, 1, 1)
+    return [(base + datetime.timedelta(minutes=i), i, i, i, i, 1.0) for i in range(start, start + count)]
+
+
+def test_seed_is_published_at_once(ring):
+    assert not ring.ready and ring.count == 0
+    ring.seed(rows(20))
+    assert ring.ready and ring.count == 8
+    candles = ring.candles(6)
+    assert candles[0].close == 14.0
+    assert candles[-1].time == datetime.datetime(2021, 1, 1, 0, 19)
+
+    CandleRing.create(ring.shm.name, 8).shm.close()
+    assert not ring.ready and ring.count == 0
+
+
+def test_snapshot_is_a_copy(ring):
+    ring.seed(rows(4))
+    count, data = ring.snapshot(4)
+    for row in rows(2, start=4):
+        ring.append(*row)
+    assert count == 4
+    assert data['close'].tolist() == [0.0, 1.0, 2.0, 3.0]
+
+
+def test_rows_overwritten_during_a_copy_are_detected(ring):
+    ring.seed(rows(8))
+    generation = ring.generation
+    count, view = ring.window(6)
+    assert ring.is_valid(generation, count, 6)
+    # the next append lands in the slot two rows before the window
+    ring.append(*rows(1, start=8)[0])
+    assert ring.is_valid(generation, count, 6)
+    # this one may be half written into the window's first row
+    ring.append(*rows(1, start=9)[0])
+    assert not ring.is_valid(generation, count, 6)
+
+
+def test_a_full_window_needs_slack(ring):
+    ring.seed(rows(8))
+    with pytest.raises(RuntimeError):
+        ring.snapshot(8)
+    count, data = ring.snapshot(7)
+    assert np.array_equal(data['close'], np.arange(1, 8, dtype=np.float64))
+
+
+def test_reseeding_invalidates_readers(ring):
+    ring.seed(rows(8))
+    generation = ring.generation
+    count, _ = ring.window(4)
+    CandleRing.create(ring.shm.name, 8).shm.close()
+    assert not ring.is_valid(generation, count, 4)
+
+
+def test_a_ring_window_feeds_the_ai_without_the_candle_tables(db, monkeypatch):
+    def no_storage(*args, **kwargs):
+        raise AssertionError('read candles from storage')
+
+    cls = factory_candle_class('BTC', '1m')
+    for name in ('get_latest_rows', 'get_rows_between', 'get_all_candles'):
+        monkeypatch.setattr(cls, name, no_storage)
+
+    ring = CandleRing.create(f'agm_test_{os.getpid()}_ai', 64)
+    base = datetime.datetime(2021, 1, 1)
+    closes = 3000000 + 50000 * np.sin(np.arange(64) / 3)
+    ring.seed([(base + datetime.timedelta(minutes=i), c, c, c + 1000, c - 1000, 1.0)
+               for i, c in enumerate(closes.tolist())])
+    try:
+        ai = AI('BTC', 0.9, '1m', 40, 0.99, back_test=True, window=RingWindow(ring))
+        ai.optimizer.stop()
+        assert ai.optimized_trade_params is not None
+        candles = ai.window_frame().candles
+        assert len(candles) == 40 and candles[-1].time == base + datetime.timedelta(minutes=63)
+        ai.trade()
+    finally:
+        ring.close()
@@ -0,0 +1,94 @@
+import datetime
+
+from models.candle import factory_candle_class
+from models.rollup import CandleRollup
+from models.rollup import benchmark
+from models.rollup import rebuild_candles
+from services.gmo_api import Ticker
+
+from config import constants
+
+
+def trade(timestamp, price, size=0.01):
+    return {'timestamp': timestamp, 'price': str(price), 'size': str(size), 'side': 'BUY'}
+
+
+def test_trades_build_the_minute_bar(db):
+    rollup = CandleRollup('BTC', [constants.DURATION_1M])
+    rollup.on_trade(trade('2024-01-01T00:00:05.000Z', 100, 0.1))
+    rollup.on_trade(trade('2024-01-01T00:00:30.000Z', 120, 0.2))
+    rollup.on_trade(trade('2024-01-01T00:00:59.999Z', 90, 0.3))
+    assert rollup.current_minute == datetime.datetime(2024, 1, 1, 9)
+    assert rollup.bar[:4] == [100, 90, 120, 90]
+    assert abs(rollup.bar[4] - 0.6) < 1e-9
+
+
+def test_the_minute_closes_on_the_timestamp_minute(db):
+    rollup = CandleRollup('BTC', [constants.DURATION_1M])
+    assert rollup.on_trade(trade('2024-01-01T00:00:59.999Z', 100)) == []
+    assert rollup.on_trade(trade('2024-01-01T00:01:00.000Z', 110)) == [constants.DURATION_1M]
+    minute = factory_candle_class('BTC', constants.DURATION_1M).get(datetime.datetime(2024, 1, 1, 9))
+    assert (minute.open, minute.close, minute.volume) == (100, 100, 0.01)
+    assert rollup.closed_candles[constants.DURATION_1M][0] == datetime.datetime(2024, 1, 1, 9)
+
+
+def test_late_messages_are_dropped(db):
+    rollup = CandleRollup('BTC', [constants.DURATION_1M])
+    rollup.on_trade(trade('2024-01-01T00:01:00.000Z', 100))
+    assert rollup.on_trade(trade('2024-01-01T00:00:59.000Z', 50)) == []
+    assert rollup.dropped == 1
+    assert rollup.bar[:4] == [100, 100, 100, 100]
+
+
+def test_a_restart_resumes_the_stored_minute(db):
+    factory_candle_class('BTC', constants.DURATION_1M).create(datetime.datetime(2024, 1, 1, 9), 100, 105, 130, 95, 0.5)
+    rollup = CandleRollup('BTC', [constants.DURATION_1M])
+    rollup.on_trade(trade('2024-01-01T00:00:40.000Z', 140, 0.25))
+    assert rollup.bar == [100, 140, 140, 95, 0.75]
+
+
+def tick(timestamp, last, volume):
+    return Ticker(timestamp=timestamp, ask=last + 1, bid=last - 1, high=last, last=last, low=last, volume=volume)
+
+
+def test_ticker_volume_is_not_stored_as_minute_volume(db):
+    rollup = CandleRollup('BTC', [constants.DURATION_1M, constants.DURATION_5M])
+    for minute in range(6):
+        # the ticker's volume is the exchange's 24h total
+        rollup.on_tick(tick(f'2024-01-01T00:{minute:02d}:10.000Z', 100 + minute, 5000 + minute))
+    start = datetime.datetime(2024, 1, 1, 9)
+    assert factory_candle_class('BTC', constants.DURATION_1M).get(start).volume is None
+    five = factory_candle_class('BTC', constants.DURATION_5M).get(start)
+    assert (five.open, five.close, five.volume) == (100, 104, None)
+    assert rollup.closed_candles[constants.DURATION_5M][5] is None
+
+
+def test_higher_durations_sum_trade_sizes(db):
+    rollup = CandleRollup('BTC', [constants.DURATION_1M, constants.DURATION_5M])
+    for minute in range(6):
+        rollup.on_trade(trade(f'2024-01-01T00:{minute:02d}:10.000Z', 100, 0.5))
+        rollup.on_trade(trade(f'2024-01-01T00:{minute:02d}:20.000Z', 100, 0.25))
+    five = factory_candle_class('BTC', constants.DURATION_5M).get(datetime.datetime(2024, 1, 1, 9))
+    assert five.volume == 5 * 0.75
+
+
+def test_rebuild_sums_known_volumes_only(db):
+    minutes = factory_candle_class('BTC', constants.DURATION_1M)
+    start = datetime.datetime(2024, 1, 1, 9)
+    volumes = [1.0, None, 2.0, None, None, None, None, None, None, None]
+    for i, volume in enumerate(volumes):
+        minutes.create(start + datetime.timedelta(minutes=i), 100 + i, 100 + i, 101 + i, 99 + i, volume)
+
+    assert rebuild_candles('BTC', constants.DURATION_5M) == 2
+    five = factory_candle_class('BTC', constants.DURATION_5M)
+    first, second = five.get(start), five.get(start + datetime.timedelta(minutes=5))
+    assert (first.open, first.close, first.high, first.low, first.volume) == (100, 104, 105, 99, 3.0)
+    assert (second.open, second.close, second.volume) == (105, 109, None)
+
+
+def test_benchmark_leaves_no_candles_behind(db):
+    result = benchmark(trades_per_second=100, minutes=6)
+    assert result['trades'] == 36000 and result['dropped'] == 0
+    assert result['closed_candles'] >= 6
+    for duration in constants.DURATIONS_ALL:
+        assert factory_candle_class('BTC', duration).get_oldest_time() is None
@@ -0,0 +1,61 @@
+import datetime
+
+import numpy as np
+
+from models.candle import factory_candle_class
+from models.params import OptimizedParams
+from models.params import sweep_settings
+from services.sweep import DurationSweep
+from services.sweep import init_worker
+from services.sweep import load_minutes
+from services.sweep import run_job
+from utils.utils import jst_now
+
+from config import constants
+
+
+def test_load_minutes_ends_at_the_current_jst_time(db, non_jst_host):
+    cls = factory_candle_class('BTC', constants.DURATION_1M)
+    now = jst_now().replace(second=0, microsecond=0)
+    for i in range(1, 31):
+        cls.create(now - datetime.timedelta(minutes=i), 100, 100, 100, 100, None)
+
+    data = load_minutes('BTC', [constants.DURATION_1M, constants.DURATION_5M], [10])
+    assert len(data['time']) == 30
+    assert data['time'][-1] == now - datetime.timedelta(minutes=1)
+    assert not data['volume'].any()
+
+
+def test_run_job_builds_candles_from_the_columns():
+    times = np.arange(np.datetime64('2024-01-01T00:00'), np.datetime64('2024-01-01T02:00')).astype('datetime64[s]')
+    closes = 3000000 + 20000 * np.sin(np.arange(len(times)) / 6)
+    init_worker({'time': times, 'open': closes, 'close': closes, 'high': closes + 1000,
+                 'low': closes - 1000, 'volume': np.ones(len(times))})
+    result = run_job((constants.DURATION_1M, 100, 'sharpe', 0.99, 3))
+    assert result['candles'] == 100
+    assert result['params'] is not None
+    assert result['first_time'] == times[-100].astype(datetime.datetime)
+    assert result['last_time'] == times[-1].astype(datetime.datetime)
+
+
+def test_nightly_run_skips_the_serial_baseline_and_stores_under_its_metric(db, monkeypatch):
+    now = jst_now().replace(second=0, microsecond=0)
+    times = np.array([now - datetime.timedelta(minutes=i) for i in range(120, 0, -1)], dtype='datetime64[s]')
+    closes = 3000000 + 20000 * np.sin(np.arange(len(times)) / 6)
+    cls = factory_candle_class('BTC', constants.DURATION_1M)
+    for time, close in zip(times.astype(datetime.datetime), closes.tolist()):
+        cls.create(time, close, close, close + 1000, close - 1000, 1)
+
+    sweep = DurationSweep(durations=[constants.DURATION_1M], past_periods=[100], metric='sharpe',
+                          stop_limit_percent=0.99, num_ranking=3)
+    serial_runs = []
+    run_serial = sweep.run_serial
+    monkeypatch.setattr(sweep, 'run_parallel', run_serial)
+    monkeypatch.setattr(sweep, 'run_serial', lambda minutes: serial_runs.append(1) or run_serial(minutes))
+    report = sweep.run()
+    assert serial_runs == [] and 'serial_seconds' not in report
+    assert report['best'] is not None
+
+    stored = OptimizedParams.load('BTC', constants.DURATION_1M, 100, sweep_settings(0.99, 3, 'sharpe'))
+    assert stored is not None and stored.trade_params.__dict__ == report['best']['params']
+    assert OptimizedParams.load('BTC', constants.DURATION_1M, 100, sweep_settings(0.99, 3, 'profit')) is None
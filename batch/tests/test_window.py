@@ -0,0 +1,40 @@
+import datetime
+
+from models.candle import factory_candle_class
+from models.window import RollingCandles
+from utils.utils import jst_now
+
+from config import constants
+
+
+def add_minutes(cls, start, count):
+    for i in range(count):
+        cls.create(start + datetime.timedelta(minutes=i), 100 + i, 100 + i, 101 + i, 99 + i, 1)
+
+
+def test_reload_drops_only_the_open_candle(db, non_jst_host):
+    cls = factory_candle_class('BTC', constants.DURATION_1M)
+    open_minute = jst_now().replace(second=0, microsecond=0)
+    # ten closed minutes and the one still being built
+    add_minutes(cls, open_minute - datetime.timedelta(minutes=10), 11)
+
+    window = RollingCandles('BTC', constants.DURATION_1M, 20)
+    candles = window.candles()
+    assert len(candles) == 10
+    assert candles[-1].time == open_minute - datetime.timedelta(minutes=1)
+
+
+def test_window_follows_closes_without_reloading(db, non_jst_host):
+    cls = factory_candle_class('BTC', constants.DURATION_1M)
+    # far enough ahead of local time that a local clock would call every row open
+    start = jst_now().replace(second=0, microsecond=0) + datetime.timedelta(hours=1)
+    add_minutes(cls, start, 6)
+
+    window = RollingCandles('BTC', constants.DURATION_1M, 20)
+    for i in range(3, 6):
+        closed = cls.get(start + datetime.timedelta(minutes=i))
+        window.update((closed.time, closed.open, closed.close, closed.high, closed.low, closed.volume))
+        assert window.candles()[-1].time == closed.time
+
+    assert len(window.candles()) == 6
+    assert window.reloads == 1
@@ -0,0 +1,73 @@
+import threading
+import time
+
+from services.worker import CoalescingWorker
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_triggers_during_a_run_coalesce_into_one_more_run():
+    running, release = threading.Event(), threading.Event()
+
+    def target():
+        running.set()
+        release.wait(5)
+
+    worker = CoalescingWorker(target)
+    worker.start()
+    try:
+        assert worker.submit()
+        assert running.wait(5)
+        assert worker.submit()
+        assert not worker.submit()
+        assert not worker.submit()
+        release.set()
+        assert wait_for(lambda: worker.runs == 2)
+        time.sleep(0.05)
+        assert worker.stats['runs'] == 2
+        assert worker.stats['triggers'] == 4 and worker.stats['coalesced'] == 2
+    finally:
+        worker.stop(5)
+
+
+def test_a_failing_run_does_not_stop_the_worker():
+    calls = []
+
+    def target():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ValueError('boom')
+
+    worker = CoalescingWorker(target)
+    worker.start()
+    try:
+        worker.submit()
+        assert wait_for(lambda: worker.runs == 1)
+        worker.submit()
+        assert wait_for(lambda: worker.runs == 2)
+        assert worker.errors == 1
+    finally:
+        worker.stop(5)
+
+
+def test_stop_joins_the_thread_without_running_pending_work():
+    running, release = threading.Event(), threading.Event()
+    worker = CoalescingWorker(lambda: running.set() or release.wait(5))
+    worker.start()
+    worker.submit()
+    assert running.wait(5)
+    worker.submit()
+    stopper = threading.Thread(target=worker.stop, args=(5,))
+    stopper.start()
+    assert wait_for(lambda: worker._stop)
+    release.set()
+    stopper.join(5)
+    assert not worker._thread.is_alive()
+    assert worker.runs == 1
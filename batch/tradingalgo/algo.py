@@ -12,13 +12,13 @@ def min_max(in_real):
     return min_val, max_val
 
 
-def ichimoku_cloud(in_real):
+def ichimoku_cloud(in_real, fill=0):
     length = len(in_real)
-    tenkan = [0] * min(9, length)
-    kijun = [0] * min(26, length)
-    senkou_a = [0] * min(26, length)
-    senkou_b = [0] * min(52, length)
-    chikou = [0] * min(26, length)
+    tenkan = [fill] * min(9, length)
+    kijun = [fill] * min(26, length)
+    senkou_a = [fill] * min(26, length)
+    senkou_b = [fill] * min(52, length)
+    chikou = [fill] * min(26, length)
     for i in range(len(in_real)):
         if i >= 9:
             min_val, max_val = min_max(in_real[i-9:i])
@@ -32,6 +32,30 @@ def ichimoku_cloud(in_real):
             min_val, max_val = min_max(in_real[i-52:i])
             senkou_b.append((min_val + max_val) / 2)
 
-    senkou_a = ([0] * 26) + senkou_b[:-26]
-    senkou_b = ([0] * 26) + senkou_b[:-26]
-    return tenkan, kijun, senkou_a, senkou_b, chikou
\ No newline at end of file
+    senkou_a = ([fill] * 26) + senkou_b[:-26]
+    senkou_b = ([fill] * 26) + senkou_b[:-26]
+    return tenkan, kijun, senkou_a, senkou_b, chikou
+
+
+def rolling_mid(in_real, window, fill=0):
+    # (min + max) / 2 of the `window` values before each index, like min_max(in_real[i-window:i])
+    length = len(in_real)
+    values = np.full(length, fill, dtype=np.float64)
+    if length > window:
+        windows = np.lib.stride_tricks.sliding_window_view(in_real[:-1], window)
+        values[window:] = (windows.min(axis=1) + windows.max(axis=1)) / 2
+    return values
+
+
+def ichimoku_cloud_array(in_real, fill=0):
+    in_real = np.asarray(in_real, dtype=np.float64)
+    length = len(in_real)
+    tenkan = rolling_mid(in_real, 9, fill)
+    kijun = rolling_mid(in_real, 26, fill)
+    senkou_b = rolling_mid(in_real, 52, fill)
+    chikou = np.full(length, fill, dtype=np.float64)
+    chikou[26:] = in_real[:-26] if length > 26 else []
+
+    # matches ichimoku_cloud, where both spans are senkou_b shifted forward by 26
+    senkou = np.r_[np.full(26, fill, dtype=np.float64), senkou_b[:-26] if length > 26 else []]
+    return tenkan, kijun, senkou, senkou.copy(), chikou
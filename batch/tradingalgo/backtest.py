@@ -0,0 +1,201 @@
+import itertools
+import time
+
+import numpy as np
+
+from tradingalgo.indicators import IndicatorCache
+from tradingalgo.metrics import compute_metrics
+from tradingalgo.metrics import rank_score
+
+FAMILIES = ('ema', 'bb', 'ichimoku', 'rsi', 'macd')
+
+# the same grids DataFrameCandle.optimize_* search
+PARAM_GRIDS = {
+    'ema': [(p1, p2) for p1 in range(5, 15) for p2 in range(12, 20)],
+    'bb': [(n, k) for n in range(10, 20) for k in np.arange(1.9, 2.1, 0.1)],
+    'ichimoku': [()],
+    'rsi': [(p, b, s) for p in range(10, 20)
+            for b in np.arange(29.9, 30.1, 0.1) for s in np.arange(69.9, 70.1, 0.1)],
+    'macd': [(f, s, g) for f in range(10, 19) for s in range(20, 30) for g in (5, 15)],
+}
+
+PARAM_NAMES = {
+    'ema': ('ema_period_1', 'ema_period_2'),
+    'bb': ('bb_n', 'bb_k'),
+    'ichimoku': (),
+    'rsi': ('rsi_period', 'rsi_buy_thread', 'rsi_sell_thread'),
+    'macd': ('macd_fast_period', 'macd_slow_period', 'macd_signal_period'),
+}
+
+
+def crosses(prev_a, prev_b, a, b):
+    return (prev_a < prev_b) & (a >= b)
+
+
+def simulate(closes, buy, sell, stop_limit_percent):
+    # replays AI.trade: a bar with a buy point never sells, and a long position
+    # exits on a sell point or when the close drops below entry * stop_limit_percent
+    length = len(closes)
+    buy_index = np.flatnonzero(buy)
+    sell_index = np.flatnonzero(sell & ~buy)
+    entries, exits = [], []
+    position = 1
+    while True:
+        k = np.searchsorted(buy_index, position)
+        if k == len(buy_index):
+            break
+        entry = buy_index[k]
+        entries.append(entry)
+
+        k = np.searchsorted(sell_index, entry + 1)
+        exit = sell_index[k] if k < len(sell_index) else length
+        stopped = (closes[entry + 1:exit] < closes[entry] * stop_limit_percent) & ~buy[entry + 1:exit]
+        if stopped.any():
+            exit = entry + 1 + int(np.argmax(stopped))
+        if exit >= length:
+            break
+        exits.append(exit)
+        position = exit + 1
+    return np.asarray(entries, dtype=np.int64), np.asarray(exits, dtype=np.int64)
+
+
+class CombinedBacktest(object):
+    def __init__(self, closes, highs, lows, stop_limit_percent, duration_seconds=0,
+                 rank_metric='profit', indicators=None):
+        self.closes = np.asarray(closes, dtype=np.float64)
+        self.highs = np.asarray(highs, dtype=np.float64)
+        self.lows = np.asarray(lows, dtype=np.float64)
+        self.stop_limit_percent = stop_limit_percent
+        self.duration_seconds = duration_seconds
+        self.rank_metric = rank_metric
+        self.indicators = indicators or IndicatorCache(self.closes)
+        self.index = np.arange(len(self.closes))
+        self.signals = {}
+        self.evaluations = 0
+
+    def signal(self, family, params):
+        key = (family, params)
+        if key not in self.signals:
+            with np.errstate(invalid='ignore'):
+                buy, sell = getattr(self, f'signal_{family}')(*params)
+            # bar 0 never trades, matching range(1, len(candles))
+            buy = np.r_[False, buy]
+            sell = np.r_[False, sell]
+            self.signals[key] = (buy, sell)
+        return self.signals[key]
+
+    def signal_ema(self, period_1, period_2):
+        e1, e2 = self.indicators.ema(period_1), self.indicators.ema(period_2)
+        ready = self.index[1:] >= max(period_1, period_2)
+        return (ready & crosses(e1[:-1], e2[:-1], e1[1:], e2[1:]),
+                ready & crosses(e2[:-1], e1[:-1], e2[1:], e1[1:]))
+
+    def signal_bb(self, n, k):
+        up, _, down = self.indicators.bbands(n, k)
+        c = self.closes
+        ready = self.index[1:] >= n
+        return (ready & (down[:-1] > c[:-1]) & (down[1:] <= c[1:]),
+                ready & (up[:-1] < c[:-1]) & (up[1:] >= c[1:]))
+
+    def signal_ichimoku(self):
+        tenkan, kijun, senkou_a, senkou_b, chikou = self.indicators.ichimoku()
+        h, l = self.highs, self.lows
+        buy = ((chikou[:-1] < h[:-1]) & (chikou[1:] >= h[1:]) &
+               (senkou_a[1:] < l[1:]) & (senkou_b[1:] < l[1:]) & (tenkan[1:] > kijun[1:]))
+        sell = ((chikou[:-1] > l[:-1]) & (chikou[1:] <= l[1:]) &
+                (senkou_a[1:] > h[1:]) & (senkou_b[1:] > h[1:]) & (tenkan[1:] < kijun[1:]))
+        return buy, sell
+
+    def signal_rsi(self, period, buy_thread, sell_thread):
+        r = self.indicators.rsi(period)
+        valid = (r[:-1] != 0) & (r[:-1] != 100)
+        return (valid & (r[:-1] < buy_thread) & (r[1:] >= buy_thread),
+                valid & (r[:-1] > sell_thread) & (r[1:] <= sell_thread))
+
+    def signal_macd(self, fast_period, slow_period, signal_period):
+        m, s, _ = self.indicators.macd(fast_period, slow_period, signal_period)
+        return ((m[1:] < 0) & (s[1:] < 0) & crosses(m[:-1], s[:-1], m[1:], s[1:]),
+                (m[1:] > 0) & (s[1:] > 0) & crosses(s[:-1], m[:-1], s[1:], m[1:]))
+
+    def run(self, rules):
+        # rules: {family: params} for every enabled family
+        buy = np.zeros(len(self.closes), dtype=bool)
+        sell = np.zeros(len(self.closes), dtype=bool)
+        for family, params in rules.items():
+            b, s = self.signal(family, params)
+            buy |= b
+            sell |= s
+        return simulate(self.closes, buy, sell, self.stop_limit_percent)
+
+    def metrics(self, rules):
+        entries, exits = self.run(rules)
+        positions = np.zeros(len(self.closes) + 1)
+        np.add.at(positions, entries, 1.0)
+        np.add.at(positions, exits, -1.0)
+        positions = np.cumsum(positions[:-1])
+        return compute_metrics(self.closes, positions, self.duration_seconds,
+                               self.closes[entries[:len(exits)]], self.closes[exits])
+
+    def score(self, rules):
+        self.evaluations += 1
+        if self.rank_metric == 'profit':
+            entries, exits = self.run(rules)
+            return float(np.sum(self.closes[exits] - self.closes[entries[:len(exits)]]))
+        return rank_score(self.metrics(rules), self.rank_metric)
+
+    def rank_family(self, family, top_k):
+        scored = [(self.score({family: params}), params) for params in PARAM_GRIDS[family]]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored[:top_k]
+
+    def optimize(self, max_enabled=len(FAMILIES), top_k=3, deadline=None, check_deadline=None):
+        # each family's best few parameter sets, then every combination of them
+        candidates = {}
+        for family in FAMILIES:
+            candidates[family] = [params for _, params in self.rank_family(family, top_k)]
+            if check_deadline is not None:
+                check_deadline(deadline)
+
+        best_score, best_rules = 0.0, None
+        for count in range(1, max_enabled + 1):
+            for families in itertools.combinations(FAMILIES, count):
+                for params in itertools.product(*(candidates[f] for f in families)):
+                    rules = dict(zip(families, params))
+                    score = self.score(rules)
+                    if score > best_score:
+                        best_score, best_rules = score, rules
+            if check_deadline is not None:
+                check_deadline(deadline)
+        return best_score, best_rules
+
+
+def rules_to_params(rules, defaults):
+    params = dict(defaults)
+    for family in FAMILIES:
+        params[f'{family}_enable'] = family in rules
+        for name, value in zip(PARAM_NAMES[family], rules.get(family, ())):
+            params[name] = value
+    return params
+
+
+def params_to_rules(params):
+    return {family: tuple(params[name] for name in PARAM_NAMES[family])
+            for family in FAMILIES if params.get(f'{family}_enable')}
+
+
+def benchmark(length=1000, stop_limit_percent=0.99, max_enabled=3, seed=0):
+    rng = np.random.default_rng(seed)
+    closes = 3000000 + np.cumsum(rng.normal(0, 5000, length))
+    spread = rng.random(length) * 3000
+    backtest = CombinedBacktest(closes, closes + spread, closes - spread, stop_limit_percent)
+    start = time.perf_counter()
+    score, rules = backtest.optimize(max_enabled)
+    elapsed = time.perf_counter() - start
+    return {
+        'candles': length,
+        'evaluations': backtest.evaluations,
+        'seconds': elapsed,
+        'evaluations_per_second': backtest.evaluations / elapsed,
+        'best_score': score,
+        'best_rules': rules,
+    }
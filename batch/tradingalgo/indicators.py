@@ -0,0 +1,37 @@
+import numpy as np
+import talib
+
+from tradingalgo.algo import ichimoku_cloud_array
+
+
+class IndicatorCache(object):
+    def __init__(self, closes):
+        self.closes = np.asarray(closes, dtype=np.float64)
+        self.values = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        if key in self.values:
+            self.hits += 1
+            return self.values[key]
+        self.misses += 1
+        value = compute()
+        self.values[key] = value
+        return value
+
+    def ema(self, period):
+        return self.get(('ema', period), lambda: talib.EMA(self.closes, period))
+
+    def bbands(self, n, k):
+        return self.get(('bbands', n, k), lambda: talib.BBANDS(self.closes, n, k, k, 0))
+
+    def ichimoku(self):
+        return self.get(('ichimoku',), lambda: ichimoku_cloud_array(self.closes))
+
+    def rsi(self, period):
+        return self.get(('rsi', period), lambda: talib.RSI(self.closes, period))
+
+    def macd(self, fast_period, slow_period, signal_period):
+        return self.get(('macd', fast_period, slow_period, signal_period),
+                        lambda: talib.MACD(self.closes, fast_period, slow_period, signal_period))
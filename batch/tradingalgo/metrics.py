@@ -0,0 +1,108 @@
+import numpy as np
+
+SECONDS_PER_YEAR = 365 * 24 * 60 * 60
+
+# 1 when a larger value is better, -1 when a smaller one is
+DIRECTIONS = {
+    'profit': 1,
+    'max_drawdown': -1,
+    'sharpe': 1,
+    'sortino': 1,
+    'win_rate': 1,
+    'trade_count': -1,
+    'exposure': -1,
+}
+
+
+def forward_fill(values, initial=0.0):
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    index = np.where(valid, np.arange(len(values)), -1)
+    np.maximum.accumulate(index, out=index)
+    filled = values[np.maximum(index, 0)]
+    filled[index < 0] = initial
+    return filled
+
+
+def positions_from_signals(times, signal_times, signal_is_buy):
+    times = np.asarray(times, dtype='datetime64[s]')
+    state = np.full(len(times), np.nan)
+    if len(signal_times):
+        index = np.searchsorted(times, np.asarray(signal_times, dtype='datetime64[s]'))
+        keep = index < len(times)
+        is_buy = np.asarray(signal_is_buy, dtype=bool)[keep]
+        state[index[keep]] = np.where(is_buy, 1.0, 0.0)
+    return forward_fill(state)
+
+
+def trades_from_positions(positions, prices):
+    change = np.diff(np.r_[0.0, positions])
+    entries = np.flatnonzero(change > 0)
+    exits = np.flatnonzero(change < 0)
+    count = min(len(entries), len(exits))
+    return prices[entries[:count]], prices[exits[:count]]
+
+
+def returns_from_positions(closes, positions):
+    closes = np.asarray(closes, dtype=np.float64)
+    if len(closes) < 2:
+        return np.zeros(0)
+    return positions[:-1] * (closes[1:] / closes[:-1] - 1.0)
+
+
+def max_drawdown(equity):
+    if len(equity) == 0:
+        return 0.0
+    peak = np.maximum.accumulate(equity)
+    return float(np.max(peak - equity))
+
+
+def sharpe_ratio(returns, periods_per_year):
+    if len(returns) < 2:
+        return 0.0
+    std = np.std(returns, ddof=1)
+    if std == 0:
+        return 0.0
+    return float(np.mean(returns) / std * np.sqrt(periods_per_year))
+
+
+def sortino_ratio(returns, periods_per_year):
+    if len(returns) < 2:
+        return 0.0
+    downside = np.minimum(returns, 0.0)
+    std = np.sqrt(np.mean(downside ** 2))
+    if std == 0:
+        return 0.0
+    return float(np.mean(returns) / std * np.sqrt(periods_per_year))
+
+
+def compute_metrics(closes, positions, duration_seconds, entry_prices=None, exit_prices=None, size=1.0):
+    closes = np.asarray(closes, dtype=np.float64)
+    positions = np.asarray(positions, dtype=np.float64)
+    if entry_prices is None or exit_prices is None:
+        entry_prices, exit_prices = trades_from_positions(positions, closes)
+
+    pnl = (np.asarray(exit_prices) - np.asarray(entry_prices)) * size
+    returns = returns_from_positions(closes, positions)
+    equity = np.r_[0.0, np.cumsum(positions[:-1] * np.diff(closes) * size)] if len(closes) else np.zeros(0)
+    periods_per_year = SECONDS_PER_YEAR / duration_seconds if duration_seconds else 0
+
+    return {
+        'profit': float(pnl.sum()),
+        'max_drawdown': max_drawdown(equity),
+        'sharpe': sharpe_ratio(returns, periods_per_year),
+        'sortino': sortino_ratio(returns, periods_per_year),
+        'win_rate': float(np.mean(pnl > 0)) if len(pnl) else 0.0,
+        'trade_count': int(len(pnl)),
+        'exposure': float(positions.mean()) if len(positions) else 0.0,
+    }
+
+
+def rank_score(metrics, name):
+    # the optimizers keep the largest score and only enable a rule that scored above
+    # zero, so only profitable runs score and smaller-is-better metrics map onto (0, 1]
+    if metrics['profit'] <= 0:
+        return 0.0
+    if DIRECTIONS[name] > 0:
+        return metrics[name]
+    return 1.0 / (1.0 + metrics[name])
@@ -0,0 +1,125 @@
+import atexit
+import logging
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
+import os
+import queue
+import tempfile
+import threading
+import time
+
+from utils.prometheus import Counter
+
+LOG_DROPPED = Counter('agm_log_records_dropped_total', 'Log records dropped because the log queue was full')
+LOG_SUPPRESSED = Counter('agm_log_records_suppressed_total', 'Hot-path log records skipped by sampling or rate limiting')
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # formatting happens on the listener thread; only resolve the message here
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc()
+
+
+def setup_logging(filename=None, level=logging.INFO, fmt=None, queue_size=10000):
+    handler = logging.FileHandler(filename) if filename else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(fmt))
+    records = queue.Queue(queue_size)
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(NonBlockingQueueHandler(records))
+    root.setLevel(level)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def kv(action, **fields):
+    return ' '.join([f'action={action}'] + [f'{key}={value}' for key, value in fields.items()])
+
+
+class SampledLogger(object):
+    # logs at most once per `interval` seconds and/or one call in `every`
+    def __init__(self, logger, interval=None, every=None, level=logging.INFO):
+        self.logger = logger
+        self.interval = interval
+        self.every = every
+        self.level = level
+        self.calls = 0
+        self.last = 0.0
+        self.lock = threading.Lock()
+
+    def should_log(self):
+        if not self.logger.isEnabledFor(self.level):
+            return False
+        with self.lock:
+            self.calls += 1
+            if self.every and (self.calls - 1) % self.every:
+                LOG_SUPPRESSED.inc()
+                return False
+            if self.interval:
+                now = time.monotonic()
+                if now - self.last < self.interval:
+                    LOG_SUPPRESSED.inc()
+                    return False
+                self.last = now
+        return True
+
+    def log(self, action, **fields):
+        # fields are only formatted for records that are actually emitted
+        if self.should_log():
+            self.logger.log(self.level, kv(action, **fields), extra={'fields': fields})
+
+
+def benchmark(records=20000, fmt='%(asctime)s %(name)-2s %(levelname)s：%(message)s'):
+    logger = logging.getLogger('agm.bench')
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    message = {'timestamp': '2021-01-01T00:00:00.000Z', 'ask': 3000000.0, 'bid': 2999000.0, 'last': 2999500.0}
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        def run(name, handler, emit):
+            handler.setFormatter(logging.Formatter(fmt))
+            logger.handlers = [handler]
+            latencies = []
+            for i in range(records):
+                start = time.perf_counter()
+                emit(i)
+                latencies.append(time.perf_counter() - start)
+            latencies.sort()
+            report[name] = {
+                'mean_us': sum(latencies) / records * 1e6,
+                'p99_us': latencies[int(records * 0.99)] * 1e6,
+                'max_us': latencies[-1] * 1e6,
+            }
+            logger.handlers = []
+
+        def blocking(i):
+            logger.info(f'action=write_ticker_info ticker={message}')
+
+        run('file_handler', logging.FileHandler(os.path.join(tmp, 'file.log')), blocking)
+
+        records_queue = queue.Queue(records + 1)
+        listener = QueueListener(records_queue, logging.FileHandler(os.path.join(tmp, 'queue.log')))
+        listener.start()
+        run('queue_handler', NonBlockingQueueHandler(records_queue), blocking)
+        start = time.perf_counter()
+        listener.stop()
+        report['queue_handler']['drain_seconds'] = time.perf_counter() - start
+
+        sampled = SampledLogger(logger, interval=1.0)
+        run('queue_handler_sampled', NonBlockingQueueHandler(queue.Queue(records + 1)),
+            lambda i: sampled.log('write_ticker_info', **message))
+    return report
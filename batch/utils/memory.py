@@ -0,0 +1,117 @@
+from collections import deque
+import logging
+import os
+import resource
+import signal
+import threading
+import time
+import tracemalloc
+
+from utils.prometheus import Gauge
+
+logger = logging.getLogger(__name__)
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # peak rather than current RSS, in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemoryMonitor(object):
+    def __init__(self, output_dir='profiles', frames=25, top=20, history=24 * 7 * 4):
+        self.output_dir = output_dir
+        self.frames = frames
+        self.top = top
+        # (wall time, rss) samples, one per sample interval
+        self.samples = deque(maxlen=history)
+        self.baseline = None
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start_tracing(self):
+        with self.lock:
+            if tracemalloc.is_tracing():
+                return False
+            tracemalloc.start(self.frames)
+            self.baseline = tracemalloc.take_snapshot()
+        logger.info(f'action=memory status=tracing frames={self.frames}')
+        return True
+
+    def sample(self):
+        rss = rss_bytes()
+        self.samples.append((time.time(), rss))
+        return rss
+
+    def _run(self, interval):
+        self.sample()
+        while not self._stop.wait(interval):
+            self.sample()
+
+    def start(self, interval=60 * 60):
+        threading.Thread(target=self._run, args=(interval,), name='memory', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def report(self):
+        report = {'rss': self.sample()}
+        if self.samples:
+            values = [rss for _, rss in self.samples]
+            report.update({
+                'since': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.samples[0][0])),
+                'rss_first': values[0],
+                'rss_min': min(values),
+                'rss_max': max(values),
+                'rss_growth': values[-1] - values[0],
+            })
+
+        with self.lock:
+            if tracemalloc.is_tracing():
+                snapshot = tracemalloc.take_snapshot().filter_traces((
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+                ))
+                current, peak = tracemalloc.get_traced_memory()
+                report['traced'] = current
+                report['traced_peak'] = peak
+                report['top'] = [str(stat) for stat in snapshot.compare_to(self.baseline, 'lineno')[:self.top]]
+
+        for key, value in report.items():
+            if key != 'top':
+                logger.info(f'action=memory_report {key}={value}')
+        for line in report.get('top', []):
+            logger.info(f'action=memory_report growth={line}')
+        self.dump(report)
+        return report
+
+    def dump(self, report):
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f'{time.strftime("%Y%m%d-%H%M%S")}-memory.txt')
+        with open(path, 'w') as f:
+            for key, value in report.items():
+                if key == 'top':
+                    f.write('top:\n' + ''.join(f'  {line}\n' for line in value))
+                else:
+                    f.write(f'{key}: {value}\n')
+        return path
+
+    def on_signal(self, *_):
+        # the first signal starts tracing so later reports can diff against it
+        if not self.start_tracing():
+            threading.Thread(target=self.report, name='memory_report', daemon=True).start()
+
+    def install_signal_handler(self, signum=getattr(signal, 'SIGUSR2', None)):
+        if signum is None:
+            return False
+        signal.signal(signum, self.on_signal)
+        return True
+
+
+MEMORY = MemoryMonitor()
+RSS = Gauge('agm_process_rss_bytes', 'Resident set size of the process', func=rss_bytes)
+TRACED = Gauge('agm_tracemalloc_bytes', 'Memory traced by tracemalloc, 0 when tracing is off',
+               func=lambda: tracemalloc.get_traced_memory()[0])
@@ -0,0 +1,101 @@
+from collections import Counter
+import cProfile
+import functools
+import logging
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Profiler(object):
+    def __init__(self, output_dir='profiles', window=60, interval=0.01):
+        self.output_dir = output_dir
+        self.window = window
+        self.interval = interval
+        self.enabled = False
+        self.stats = {}
+        self.stacks = Counter()
+        self.lock = threading.Lock()
+        # cProfile sits on sys.monitoring from 3.12, which allows one active profiler per process
+        self.profiling = threading.Lock()
+
+    def start(self, window=None):
+        with self.lock:
+            if self.enabled:
+                return False
+            self.stats = {}
+            self.stacks = Counter()
+            self.enabled = True
+        window = window or self.window
+        threading.Thread(target=self._sample, args=(window,), name='profiler', daemon=True).start()
+        logger.info(f'action=profiler status=start window={window}')
+        return True
+
+    def record(self, name, func, *args, **kwargs):
+        # calls that overlap a profiled one, in any thread, run unprofiled
+        if not self.profiling.acquire(blocking=False):
+            return func(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            self.profiling.release()
+            with self.lock:
+                if name in self.stats:
+                    self.stats[name].add(profile)
+                else:
+                    self.stats[name] = pstats.Stats(profile)
+
+    def _sample(self, window):
+        own = threading.get_ident()
+        end = time.monotonic() + window
+        while time.monotonic() < end:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+            time.sleep(self.interval)
+        self.enabled = False
+        self.dump()
+
+    def dump(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        with self.lock:
+            for name, stats in self.stats.items():
+                stats.dump_stats(os.path.join(self.output_dir, f'{stamp}-{name}.pstats'))
+            path = os.path.join(self.output_dir, f'{stamp}-stacks.collapsed')
+            with open(path, 'w') as f:
+                for stack, count in self.stacks.most_common():
+                    f.write(f'{stack} {count}\n')
+        logger.info(f'action=profiler status=dump dir={self.output_dir} stamp={stamp}')
+
+    def install_signal_handler(self, signum=getattr(signal, 'SIGUSR1', None)):
+        if signum is None:
+            return False
+        signal.signal(signum, lambda *_: self.start())
+        return True
+
+
+PROFILER = Profiler()
+
+
+def profiled(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            return PROFILER.record(name, func, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,162 @@
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Registry(object):
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class Counter(object):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0.0
+        self.lock = threading.Lock()
+        registry.register(self)
+
+    def inc(self, amount=1.0):
+        with self.lock:
+            self.value += amount
+
+    def samples(self):
+        return [f'{self.name} {self.value}']
+
+
+class Gauge(object):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, func=None, registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.func = func
+        self.value = 0.0
+        registry.register(self)
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        value = self.func() if self.func is not None else self.value
+        return [f'{self.name} {value}']
+
+
+class Histogram(object):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+        registry.register(self)
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self):
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f'{self.name}_sum {total}')
+        lines.append(f'{self.name}_count {cumulative}')
+        return lines
+
+
+class RateGauge(Gauge):
+    # average rate over the last `window` seconds; scrapes only add samples, so any
+    # number of scrapers read the same value
+    def __init__(self, name, documentation, counter, window=60.0, resolution=1.0, registry=REGISTRY):
+        super().__init__(name, documentation, func=self.rate, registry=registry)
+        self.counter = counter
+        self.window = window
+        self.resolution = resolution
+        self.history = deque([(time.monotonic(), counter.value)])
+        self.lock = threading.Lock()
+
+    def rate(self):
+        now, value = time.monotonic(), self.counter.value
+        with self.lock:
+            history = self.history
+            # the newest sample at least a window old is the base
+            while len(history) > 1 and history[1][0] <= now - self.window:
+                history.popleft()
+            if now - history[-1][0] >= self.resolution:
+                history.append((now, value))
+            base_time, base_value = history[0]
+        if now <= base_time:
+            return 0.0
+        return (value - base_value) / (now - base_time)
+
+
+def start_http_server(port, host='127.0.0.1', registry=REGISTRY):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics_server', daemon=True)
+    thread.start()
+    logger.info(f'action=start_http_server host={host} port={server.server_port}')
+    return server
@@ -1,5 +1,14 @@
+import datetime
+
 import omitempty
 
+from config import constants
+
+
+def jst_now():
+    # candle times are stored as naive JST whatever the host timezone is
+    return datetime.datetime.utcnow() + datetime.timedelta(hours=constants.DIFF_JST_FROM_UTC)
+
 
 class Serializer(object):
     @property